@@ -7,11 +7,17 @@ __maintainer__ = "Patrick Renner, Alexander Sahm"
 __email__ = "opensource@pomfort.com"
 """
 
+import hashlib
 import os
 import shutil
+import tempfile
+import time
+import timeit
 
 import click
 from .history import MHLHistory
+from .hasher import hash_file, IOBackend, C4, c4_string_from_digest, c4_digest_from_string
+from .traverse import post_order_lexicographic
 from . import chain_xml_parser
 from . import hashlist_xml_parser
 
@@ -96,3 +102,156 @@ def create_dummy_folder(root_path, prefix, depth):
     for folder in range(0, num_folders):
         folder_name = prefix + chr(ord("A") + folder)
         create_dummy_folder(folder_path, folder_name, depth - 1)
+
+
+@click.command()
+@click.argument("file_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--hash_format", "-h", default="xxh64", help="Hash format to benchmark the io backends with")
+@click.option("--repetitions", "-r", default=3, help="Number of times each io backend hashes the file")
+def benchmark_io(file_path, hash_format, repetitions):
+    """
+    hash a file with all io backends and print the throughput and the growth of the page cache
+
+    the file is evicted from the page cache before each run where the platform supports it (posix_fadvise), so
+    all runs read from disk. the page cache growth is read from /proc/meminfo and only available on Linux.
+    """
+
+    file_size = os.path.getsize(file_path)
+    for io_backend in IOBackend:
+        durations = []
+        cache_growths = []
+        for _ in range(repetitions):
+            _evict_from_page_cache(file_path)
+            cached_before = _page_cache_size()
+            start = time.perf_counter()
+            hash_file(file_path, hash_format, io_backend=io_backend)
+            durations.append(time.perf_counter() - start)
+            cached_after = _page_cache_size()
+            if cached_before is not None and cached_after is not None:
+                cache_growths.append(cached_after - cached_before)
+
+        throughput = file_size / min(durations) / (1024 * 1024)
+        cache_growth = "n/a" if not cache_growths else f"{max(cache_growths) / (1024 * 1024):.1f} MB"
+        print(f"{io_backend.value:>9}: {throughput:8.1f} MB/s, page cache growth: {cache_growth}")
+    _evict_from_page_cache(file_path)
+
+
+def _evict_from_page_cache(file_path):
+    if not hasattr(os, "posix_fadvise"):
+        return
+    file_descriptor = os.open(file_path, os.O_RDONLY)
+    try:
+        os.fsync(file_descriptor)
+        os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(file_descriptor)
+
+
+def _page_cache_size():
+    """returns the size of the page cache in bytes, or None if it's unknown on this platform"""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("Cached:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+@click.command()
+@click.option("--count", "-c", default=10000, help="Number of C4 IDs to encode and decode")
+def benchmark_c4(count):
+    """
+    compare the per ID cost of encoding and decoding C4 IDs with the previous big integer implementation
+    """
+
+    digests = [hashlib.sha512(i.to_bytes(8, byteorder="big")).digest() for i in range(count)]
+    c4_strings = [c4_string_from_digest(digest) for digest in digests]
+    assert c4_strings == [_c4_string_from_digest_big_int(digest) for digest in digests]
+    assert digests == [_c4_digest_from_string_big_int(c4_string) for c4_string in c4_strings]
+
+    benchmarks = [
+        ("encode (big int)", _c4_string_from_digest_big_int, digests),
+        ("encode", c4_string_from_digest, digests),
+        ("decode (big int)", _c4_digest_from_string_big_int, c4_strings),
+        ("decode", c4_digest_from_string, c4_strings),
+    ]
+    for name, function, inputs in benchmarks:
+        duration = min(timeit.repeat(lambda: [function(value) for value in inputs], number=1, repeat=3))
+        print(f"{name:>16}: {duration / count * 1000000:6.2f} µs per C4 ID")
+
+
+def _c4_string_from_digest_big_int(digest):
+    # the former C4.string_digest implementation, one big integer divmod per digit
+    hash_value = int.from_bytes(digest, byteorder="big")
+    c4_string = ""
+    while hash_value != 0:
+        hash_value, modulo = divmod(hash_value, 58)
+        c4_string = C4.charset[modulo] + c4_string
+    return "c4" + c4_string.rjust(88, "1")
+
+
+def _c4_digest_from_string_big_int(c4_string):
+    # the former C4.bytes_from_string_digest implementation
+    result = 0
+    for character in c4_string[2:]:
+        result = result * 58 + C4.charset.index(character)
+    return result.to_bytes(64, byteorder="big")
+
+
+@click.command()
+@click.option("--depth", "-d", default=2000, help="Number of nested folders of the deep folder tree")
+@click.option("--width", "-w", default=100000, help="Number of files in the folder of the wide folder tree")
+def benchmark_traversal(depth, width):
+    """
+    compare the traversal with the former recursive traversal on a deep and a wide folder tree
+
+    the depth is limited by the maximum path length of the platform (4096 characters on Linux, so roughly 2000
+    nested folders with single character names).
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        deep_root = os.path.join(temp_dir, "deep")
+        deep_folders = [os.path.join(deep_root, *(["d"] * level)) for level in range(depth + 1)]
+        num_created_deep_folders = 0
+        try:
+            # os.makedirs and shutil.rmtree are recursive as well, so the deep tree is created and removed in a loop
+            for folder in deep_folders:
+                os.mkdir(folder)
+                num_created_deep_folders += 1
+
+            wide_root = os.path.join(temp_dir, "wide")
+            os.mkdir(wide_root)
+            for index in range(width):
+                open(os.path.join(wide_root, f"{index:07d}.exr"), "w").close()
+
+            for tree_name, root in [(f"{depth} folders deep", deep_root), (f"{width} files wide", wide_root)]:
+                for traversal_name, traversal in [
+                    ("recursive", _post_order_lexicographic_recursive),
+                    ("iterative", post_order_lexicographic),
+                ]:
+                    start = time.perf_counter()
+                    try:
+                        num_entries = sum(len(children) for _, children in traversal(root))
+                    except RecursionError:
+                        print(f"{tree_name:>22}, {traversal_name}: failed (recursion limit)")
+                        continue
+                    duration = time.perf_counter() - start
+                    print(f"{tree_name:>22}, {traversal_name}: {duration:.3f}s for {num_entries} entries")
+        finally:
+            for folder in reversed(deep_folders[:num_created_deep_folders]):
+                os.rmdir(folder)
+
+
+def _post_order_lexicographic_recursive(top):
+    # the former implementation of post_order_lexicographic (without ignore patterns) as a reference
+    names = os.listdir(top)
+    names.sort()
+    children = [(name, os.path.isdir(os.path.join(top, name))) for name in names]
+    for name, is_dir in children:
+        path = os.path.join(top, name)
+        if is_dir and not os.path.islink(path):
+            for x in _post_order_lexicographic_recursive(path):
+                yield x
+    yield top, children
@@ -11,7 +11,6 @@ from . import logger
 from .__version__ import ascmhl_reference_hash_format
 from .chain import MHLChain, MHLChainGeneration
 from .hashlist import MHLHashList
-from .hasher import hash_file
 import os
 
 
@@ -91,7 +90,7 @@ def _append_new_generation_to_file(chain: MHLChain, hash_list: MHLHashList):
         hash_list.generation_number,
         hash_list.get_file_name(),
         ascmhl_reference_hash_format,
-        hash_file(hash_list.file_path, ascmhl_reference_hash_format),
+        hash_list.generate_reference_hash(),
     )
 
     # TODO sanity checks
@@ -23,6 +23,9 @@ mhldevtool_cli.add_command(_debug_commands.readmhlfile)
 mhldevtool_cli.add_command(_debug_commands.readchainfile)
 mhldevtool_cli.add_command(_debug_commands.readmhlhistory)
 mhldevtool_cli.add_command(_debug_commands.create_dummy_file_structure, "create_dummy_file_structure")
+mhldevtool_cli.add_command(_debug_commands.benchmark_io, "benchmark_io")
+mhldevtool_cli.add_command(_debug_commands.benchmark_c4, "benchmark_c4")
+mhldevtool_cli.add_command(_debug_commands.benchmark_traversal, "benchmark_traversal")
 
 
 if __name__ == "__main__":
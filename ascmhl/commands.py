@@ -10,6 +10,7 @@ __email__ = "opensource@pomfort.com"
 import datetime
 import os
 import platform
+import time
 
 import click
 from lxml import etree
@@ -28,11 +29,23 @@ from .__version__ import (
     ascmhl_default_hashformat,
 )
 from .generator import MHLGenerationCreationSession
-from .hasher import hash_file, DirectoryHashContext, multiple_format_hash_file
+from .hasher import (
+    hash_file,
+    hash_file_digest,
+    multiple_format_hash_file_digests,
+    HashDigest,
+    MultipleFormatDirectoryHashContext,
+    IOBackend,
+    hash_backend_names,
+    new_hasher_for_hash_type,
+    select_hash_backend,
+    update_hashers_from_file,
+)
 from .hashlist import MHLMediaHash, MHLCreatorInfo, MHLProcessInfo, MHLTool, MHLProcess, MHLAuthor
 from .history import MHLHistory
-from .traverse import post_order_lexicographic
-from typing import Dict
+from .traverse import post_order_lexicographic, post_order_lexicographic_entries
+from .workers import map_folder_files
+from typing import Dict, List, Tuple
 from collections import namedtuple
 
 
@@ -69,6 +82,20 @@ from collections import namedtuple
     is_flag=True,
     help="Detect automatically renamed files",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of files that are hashed (and folders that are listed) in parallel",
+)
+@click.option(
+    "--io_backend",
+    default=IOBackend.buffered.value,
+    type=click.Choice([io_backend.value for io_backend in IOBackend]),
+    help="How files are read for hashing, uncached and direct keep the hashed files out of the page cache. "
+    "mmap avoids copying, but a file truncated while hashing terminates the process (SIGBUS) instead of failing",
+)
 # creatorinfo values
 @click.option(
     "--author_name",
@@ -128,6 +155,8 @@ def create(
     hash_format,
     no_directory_hashes,
     detect_renaming,
+    jobs,
+    io_backend,
     single_file,
     ignore_list,
     ignore_spec_file,
@@ -178,6 +207,8 @@ def create(
         comment,
         ignore_list,
         ignore_spec_file,
+        jobs,
+        IOBackend(io_backend),
     )
     return
 
@@ -196,6 +227,8 @@ def create_for_folder_subcommand(
     comment,
     ignore_list=None,
     ignore_spec_file=None,
+    jobs=1,
+    io_backend=None,
 ):
     # command formerly known as "seal"
     """
@@ -207,6 +240,9 @@ def create_for_folder_subcommand(
     The command finds files that are registered in the `asc-mhl` folder but that are missing in the file system.
     Files that are existent in the file system but are not registered in the `asc-mhl` folder yet, are registered
     as new entries in the newly created generation(s).
+
+    With more than one job the files are hashed in parallel, the results are still added to the new generation and
+    the directory hashes in traversal order.
     """
     logger.verbose_logging = verbose
 
@@ -215,13 +251,13 @@ def create_for_folder_subcommand(
 
     logger.verbose(f"Creating new generation for folder at path: {root_path} ...")
 
-    existing_history = MHLHistory.load_from_path(root_path)
+    # child histories that aren't referenced in the history yet are loaded while traversing the folder
+    existing_history = MHLHistory.load_from_path(root_path, jobs=jobs, find_child_histories=False)
+    loaded_child_histories = []
 
     # we collect all paths we expect to find first and remove every path that we actually found while
     # traversing the file system, so this set will at the end contain the file paths not found in the file system
-    not_found_paths = existing_history.set_of_file_paths()
-    renamed_files = existing_history.renamed_path_with_previous_path()
-    not_found_paths = {p if renamed_files.get(p, None) is None else renamed_files[p] for p in not_found_paths}
+    not_found_paths = _recorded_file_paths(existing_history)
     new_paths = set()
     missing_asc_mhl_folder = set()
 
@@ -239,73 +275,68 @@ def create_for_folder_subcommand(
     dir_structure_hash_mapping_lookup = {}
     hash_format_list = sorted(hash_formats)
 
-    for folder_path, children in post_order_lexicographic(root_path, session.ignore_spec.get_path_spec()):
-        # generate directory hashes
-        dir_hash_context_lookup = {}
+    # the file hashes are generated (possibly in parallel) ahead of the loop, everything else happens in order
+    def hash_file_path_for_sealing(file_entry):
+        # also fetch the (cached) stat result on the worker thread, seal_file_path needs it later
+        file_entry.stat()
+        return hash_file_path(existing_history, file_entry.path, hash_format_list, io_backend)
 
+    folder_chunks = post_order_lexicographic_entries(
+        root_path,
+        session.ignore_spec.get_path_spec(),
+        jobs,
+        _child_history_loader(existing_history, loaded_child_histories),
+    )
+    for folder, children, hash_lookups in map_folder_files(
+        hash_file_path_for_sealing, folder_chunks, jobs, stat_folders=True
+    ):
+        # the child histories are loaded before their folders are traversed, also expect their recorded files
+        while loaded_child_histories:
+            not_found_paths.update(_recorded_file_paths(loaded_child_histories.pop()))
+        folder_path = folder.path
+        # generate directory hashes for all formats at once
+        dir_hash_context = None
         if not no_directory_hashes:
-            # Create a DirectoryHashContext for each hash format and store in the lookup
-            for hash_format in hash_format_list:
-                dir_hash_context_lookup[hash_format] = DirectoryHashContext(hash_format)
-        for item_name, is_dir in children:
-            file_path = os.path.join(folder_path, item_name)
+            dir_hash_context = MultipleFormatDirectoryHashContext(hash_format_list)
+        for child, current_hash_lookup in zip(children, hash_lookups):
+            file_path = child.path
             not_found_paths.discard(file_path)
-            for hash_list in existing_history.hash_lists:
-                for media_hash in hash_list.media_hashes:
-                    if media_hash.path == existing_history.get_relative_file_path(file_path):
-                        break
-                else:
-                    new_paths.add(file_path)
-            if is_dir:
-                if not no_directory_hashes:
-                    path_content_hash_lookup = dir_content_hash_mapping_lookup.pop(file_path)
-                    path_structure_hash_lookup = dir_structure_hash_mapping_lookup.pop(file_path)
-
-                    for hash_format, dir_hash_context in dir_hash_context_lookup.items():
-                        dir_hash_context.append_directory_hashes(
-                            file_path,
-                            path_content_hash_lookup[hash_format],
-                            path_structure_hash_lookup[hash_format],
-                        )
+            # paths that are missing in any of the generations are candidates for renamed files
+            relative_path = child.relative_path
+            if existing_history.number_of_generations_with_path(relative_path) < len(existing_history.hash_lists):
+                new_paths.add(file_path)
+            if child.is_dir:
+                if dir_hash_context is not None:
+                    dir_hash_context.append_directory_hashes(
+                        file_path,
+                        dir_content_hash_mapping_lookup.pop(file_path),
+                        dir_structure_hash_mapping_lookup.pop(file_path),
+                    )
             else:
-                seal_result = seal_file_path(existing_history, file_path, hash_format_list, session)
+                seal_result = seal_file_path(
+                    existing_history, file_path, hash_format_list, session, current_hash_lookup, child.stat()
+                )
 
                 for hash_format, result_tuple in seal_result.items():
-                    dir_hash_context = None
-
-                    if not no_directory_hashes:
-                        dir_hash_context = dir_hash_context_lookup[hash_format]
-
-                    hash_string = result_tuple.hash_value
-                    success = result_tuple.success
-                    if not success:
+                    if not result_tuple.success:
                         num_failed_verifications += 1
-                    if dir_hash_context is not None:
-                        dir_hash_context.append_file_hash(file_path, hash_string)
+                if dir_hash_context is not None:
+                    dir_hash_context.append_file_hashes(
+                        file_path,
+                        {hash_format: result_tuple.hash_value for hash_format, result_tuple in seal_result.items()},
+                    )
 
         # Calculate the directory hashes for each format
         dir_content_hash_lookup = {}
         dir_structure_hash_lookup = {}
 
-        if not no_directory_hashes:
-            for hash_format, dir_hash_context in dir_hash_context_lookup.items():
-                dir_content_hash = dir_hash_context.final_content_hash_str()
-                dir_structure_hash = dir_hash_context.final_structure_hash_str()
-
-                if dir_content_hash_mapping_lookup and folder_path in dir_content_hash_mapping_lookup.keys():
-                    dir_content_hash_mapping_lookup[folder_path][hash_format] = dir_content_hash
-                else:
-                    dir_content_hash_mapping_lookup[folder_path] = {hash_format: dir_content_hash}
-
-                if dir_structure_hash_mapping_lookup and folder_path in dir_structure_hash_mapping_lookup.keys():
-                    dir_structure_hash_mapping_lookup[folder_path][hash_format] = dir_structure_hash
-                else:
-                    dir_structure_hash_mapping_lookup[folder_path] = {hash_format: dir_structure_hash}
-
-                dir_content_hash_lookup[hash_format] = dir_content_hash
-                dir_structure_hash_lookup[hash_format] = dir_structure_hash
+        if dir_hash_context is not None:
+            dir_content_hash_lookup = dir_hash_context.final_content_digest_lookup()
+            dir_structure_hash_lookup = dir_hash_context.final_structure_digest_lookup()
+            dir_content_hash_mapping_lookup[folder_path] = dir_content_hash_lookup
+            dir_structure_hash_mapping_lookup[folder_path] = dir_structure_hash_lookup
 
-        modification_date = datetime.datetime.fromtimestamp(os.path.getmtime(folder_path))
+        modification_date = datetime.datetime.fromtimestamp(folder.stat().st_mtime)
 
         session.append_multiple_format_directory_hashes(
             folder_path, modification_date, dir_content_hash_lookup, dir_structure_hash_lookup
@@ -320,63 +351,9 @@ def create_for_folder_subcommand(
                 missing_asc_mhl_folder.add(os.path.dirname(referenced_asc_folder))
 
     if detect_renaming:
-        found_file_paths = set()
-        for new_path in new_paths:
-            for not_found_path in not_found_paths:
-                # find hashes to not_found_path and new_path
-                not_found_path_history, relative_not_found_path = existing_history.find_history_for_path(
-                    existing_history.get_relative_file_path(not_found_path)
-                )
-                not_found_path_hash = not_found_path_history.find_first_hash_entry_for_path(relative_not_found_path)
-
-                new_path_history, new_path_media_hash = None, None
-                for history, hash_list in session.new_hash_lists.items():
-                    new_path_media_hash = hash_list.find_media_hash_for_path(history.get_relative_file_path(new_path))
-                    if new_path_media_hash is not None:
-                        new_path_history = history
-                        break
-                new_path_hash = new_path_media_hash.find_hash_entry_for_format(not_found_path_hash.hash_format)
-                # compare found hashes
-                if new_path_hash:
-                    if new_path_hash.hash_string == not_found_path_hash.hash_string:
-                        if os.path.basename(new_path) != os.path.basename(not_found_path):
-                            logger.info(
-                                "a renamed {} was detected: from {} to {}".format(
-                                    "folder" if os.path.isdir(new_path) else "file",
-                                    relative_not_found_path,
-                                    existing_history.get_relative_file_path(new_path),
-                                )
-                            )
-                        if new_path_media_hash.path == ".":
-                            root_hash = session.new_hash_lists[
-                                new_path_history.parent_history
-                            ].find_media_hash_for_path(new_path_history.parent_history.get_relative_file_path(new_path))
-                            if root_hash:
-                                root_hash.previous_path = relative_not_found_path
-                        else:
-                            new_path_media_hash.previous_path = relative_not_found_path
-                        if not_found_path in missing_asc_mhl_folder:
-                            if os.path.exists(os.path.join(new_path, ascmhl_folder_name)):
-                                missing_asc_mhl_folder.discard(not_found_path)
-                            else:
-                                missing_asc_mhl_folder.discard(not_found_path)
-                                missing_asc_mhl_folder.add(new_path)
-                        found_file_paths.add(not_found_path)
-                else:
-                    old_hash_format_for_new_path = hasher.hash_file(
-                        os.path.join(root_path, new_path), not_found_path_hash.hash_format
-                    )
-                    if old_hash_format_for_new_path == not_found_path_hash.hash_string:
-                        if os.path.basename(new_path) != os.path.basename(not_found_path):
-                            logger.info(
-                                "a renamed {} was detected: from {} to {}".format(
-                                    "folder" if os.path.isdir(new_path) else "file",
-                                    relative_not_found_path,
-                                    existing_history.get_relative_file_path(new_path),
-                                )
-                            )
-                        new_path_media_hash.previous_path = relative_not_found_path
-                        found_file_paths.add(not_found_path)
+        found_file_paths = _detect_renamed_paths(
+            existing_history, session, new_paths, not_found_paths, missing_asc_mhl_folder, io_backend
+        )
         not_found_paths = not_found_paths - found_file_paths
     commit_session(session, author_name, author_email, author_phone, author_role, location, comment)
 
@@ -535,6 +512,20 @@ def create_for_single_files_subcommand(
 @click.option(
     "--packing_list", "-pl", default=None, type=click.Path(exists=True), help="Verify against an external packing list"
 )
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of files that are hashed (and folders that are listed) in parallel",
+)
+@click.option(
+    "--io_backend",
+    default=IOBackend.buffered.value,
+    type=click.Choice([io_backend.value for io_backend in IOBackend]),
+    help="How files are read for hashing, uncached and direct keep the hashed files out of the page cache. "
+    "mmap avoids copying, but a file truncated while hashing terminates the process (SIGBUS) instead of failing",
+)
 def verify(
     root_path,
     verbose,
@@ -546,6 +537,8 @@ def verify(
     ignore_spec_file,
     calculate_only,
     root_only,
+    jobs,
+    io_backend,
 ):
     """
     Verify a folder, single file(s), or a directory hash
@@ -560,22 +553,55 @@ def verify(
 
     if packing_list is not None:
         verify_entire_folder(
-            root_path, verbose, single_file, packing_list, ignore_list, ignore_spec_file, calculate_only
+            root_path,
+            verbose,
+            single_file,
+            packing_list,
+            ignore_list,
+            ignore_spec_file,
+            calculate_only,
+            jobs,
+            IOBackend(io_backend),
         )
         return
 
     if directory_hash is True:
         verify_directory_hash_subcommand(
-            root_path, verbose, hash_format, ignore_list, ignore_spec_file, calculate_only, root_only
+            root_path,
+            verbose,
+            hash_format,
+            ignore_list,
+            ignore_spec_file,
+            calculate_only,
+            root_only,
+            jobs,
+            IOBackend(io_backend),
         )
         return
 
-    verify_entire_folder(root_path, verbose, single_file, None, ignore_list, ignore_spec_file)
+    verify_entire_folder(
+        root_path,
+        verbose,
+        single_file,
+        None,
+        ignore_list,
+        ignore_spec_file,
+        jobs=jobs,
+        io_backend=IOBackend(io_backend),
+    )
     return
 
 
 def verify_entire_folder(
-    root_path, verbose, single_file, packing_list_path, ignore_list=None, ignore_spec_file=None, calculate_only=None
+    root_path,
+    verbose,
+    single_file,
+    packing_list_path,
+    ignore_list=None,
+    ignore_spec_file=None,
+    calculate_only=None,
+    jobs=1,
+    io_backend=None,
 ):
     """
     Checks MHL hashes from all generations / a packing list against all file hashes.
@@ -587,6 +613,9 @@ def verify_entire_folder(
     against the records in the asc-mhl folder/packing list. The command finds all files that are existent in
     the file system but are not registered in the `asc-mhl` folder/packing list yet, and all files that are
     registered in the `asc-mhl` folder/packing list but that are missing in the file system.
+
+    With more than one job the files are hashed in parallel, results are still compared and reported in
+    traversal order.
     """
     logger.verbose_logging = verbose
 
@@ -598,19 +627,21 @@ def verify_entire_folder(
 
     logger.verbose(f"check folder at path: {root_path}")
 
+    # child histories that aren't referenced in the history yet are loaded while traversing the folder
+    history_folder_callback = None
+    loaded_child_histories = []
     if packing_list_path is not None:
         existing_history = MHLHistory.load_from_packing_list_path(packing_list_path, root_path)
     else:
-        existing_history = MHLHistory.load_from_path(root_path)
+        existing_history = MHLHistory.load_from_path(root_path, jobs=jobs, find_child_histories=False)
+        history_folder_callback = _child_history_loader(existing_history, loaded_child_histories)
 
     if len(existing_history.hash_lists) == 0:
         raise errors.NoMHLHistoryException(root_path)
 
     # we collect all paths we expect to find first and remove every path that we actually found while
     # traversing the file system, so this set will at the end contain the file paths not found in the file system
-    not_found_paths = existing_history.set_of_file_paths()
-    renamed_files = existing_history.renamed_path_with_previous_path()
-    not_found_paths = {p if renamed_files.get(p, None) is None else renamed_files[p] for p in not_found_paths}
+    not_found_paths = _recorded_file_paths(existing_history)
 
     num_failed_verifications = 0
     num_new_files = 0
@@ -619,24 +650,38 @@ def verify_entire_folder(
 
     found_single_file = False
 
-    for folder_path, children in post_order_lexicographic(root_path, ignore_spec.get_path_spec()):
-        for item_name, is_dir in children:
-            file_path = os.path.join(folder_path, item_name)
+    def is_file_to_verify(file_path):
+        return single_file is None or os.path.realpath(single_file) == os.path.realpath(file_path)
+
+    # the file hashes are generated (possibly in parallel) ahead of the loop, the comparison happens in order
+    def hash_file_path_for_verification(file_entry):
+        file_path = file_entry.path
+        if not is_file_to_verify(file_path):
+            return None
+        history, history_relative_path = _find_history_and_original_path(existing_history, file_entry.relative_path)
+        original_hash_entry = history.find_original_hash_entry_for_path(history_relative_path)
+        if original_hash_entry is None:
+            return None
+        return hash_file_digest(file_path, original_hash_entry.hash_format, io_backend=io_backend)
+
+    folder_chunks = post_order_lexicographic_entries(
+        root_path, ignore_spec.get_path_spec(), jobs, history_folder_callback
+    )
+    for folder, children, current_hashes in map_folder_files(hash_file_path_for_verification, folder_chunks, jobs):
+        # the child histories are loaded before their folders are traversed, also expect their recorded files
+        while loaded_child_histories:
+            not_found_paths.update(_recorded_file_paths(loaded_child_histories.pop()))
+        for child, current_hash in zip(children, current_hashes):
+            file_path = child.path
             not_found_paths.discard(file_path)
-            relative_path = existing_history.get_relative_file_path(file_path)
-            history, history_relative_path = existing_history.find_history_for_path(relative_path)
-            if is_dir:
+            if child.is_dir:
                 # TODO: find new directories here
                 continue
 
-            for hash_list in existing_history.hash_lists:
-                for media_hash in hash_list.media_hashes:
-                    if media_hash.path != history_relative_path:
-                        continue
-                    history_relative_path = media_hash.previous_path or history_relative_path
-                    break
+            relative_path = child.relative_path
+            history, history_relative_path = _find_history_and_original_path(existing_history, relative_path)
 
-            if single_file is None or os.path.realpath(single_file) == os.path.realpath(file_path):
+            if is_file_to_verify(file_path):
                 # check if there is an existing hash in the other generations and verify
                 original_hash_entry = history.find_original_hash_entry_for_path(history_relative_path)
 
@@ -646,9 +691,8 @@ def verify_entire_folder(
                     num_new_files += 1
                     continue
 
-                # create a new hash and compare it against the original hash entry
-                current_hash = hash_file(file_path, original_hash_entry.hash_format)
-                if original_hash_entry.hash_string == current_hash:
+                # compare the new hash against the original hash entry
+                if original_hash_entry.digest == current_hash:
                     logger.verbose(f"verification ({original_hash_entry.hash_format}) of file {relative_path}: OK")
                 else:
                     logger.error(
@@ -675,7 +719,15 @@ def verify_entire_folder(
 
 
 def verify_directory_hash_subcommand(
-    root_path, verbose, hash_format, ignore_list=None, ignore_spec_file=None, calculate_only=False, root_only=False
+    root_path,
+    verbose,
+    hash_format,
+    ignore_list=None,
+    ignore_spec_file=None,
+    calculate_only=False,
+    root_only=False,
+    jobs=1,
+    io_backend=None,
 ):
     """
     Checks MHL directory hashes from all generations against computed directory hashes.
@@ -685,6 +737,7 @@ def verify_directory_hash_subcommand(
     Traverses through the content of a folder, hashes all found files, create directory hashes, and compares
     ("verifies") the hashes against the directory hash records in the asc-mhl folder.
     Content directory hashes and structure directory hashes are compared individually.
+    With more than one job the files are hashed in parallel.
     """
     logger.verbose_logging = verbose
 
@@ -693,7 +746,8 @@ def verify_directory_hash_subcommand(
 
     logger.verbose(f"check folder at path: {root_path}")
 
-    existing_history = MHLHistory.load_from_path(root_path)
+    # child histories that aren't referenced in the history yet are loaded while traversing the folder
+    existing_history = MHLHistory.load_from_path(root_path, jobs=jobs, find_child_histories=False)
 
     ignore_spec = ignore.MHLIgnoreSpec(existing_history.latest_ignore_patterns(), ignore_list, ignore_spec_file)
 
@@ -744,18 +798,24 @@ def verify_directory_hash_subcommand(
     # store the directory hashes of sub folders so we can use it when calculating the hash of the parent folder
     dir_content_hash_mappings = {}
     dir_structure_hash_mappings = {}
-    for folder_path, children in post_order_lexicographic(root_path, ignore_spec.get_path_spec()):
-        # generate directory hashes - will match the format dict[str, DirectoryHashContext]
-        dir_hash_context_lookup = {}
-
-        # create a DirectoryHashContext for each hash format and store in the lookup
-        for hash_format in hash_format_list:
-            dir_hash_context_lookup[hash_format] = DirectoryHashContext(hash_format)
-
-        for item_name, is_dir in children:
-            file_path = os.path.join(folder_path, item_name)
-            if is_dir:
-                relative_path = existing_history.get_relative_file_path(file_path)
+
+    def hash_file_path_for_directory_hashes(file_entry):
+        return multiple_format_hash_file_digests(file_entry.path, hash_format_list, io_backend=io_backend)
+
+    folder_chunks = post_order_lexicographic_entries(
+        root_path, ignore_spec.get_path_spec(), jobs, _child_history_loader(existing_history, [])
+    )
+    for folder, children, file_hash_lookups in map_folder_files(
+        hash_file_path_for_directory_hashes, folder_chunks, jobs, stat_folders=True
+    ):
+        folder_path = folder.path
+        # generate directory hashes for all formats at once
+        dir_hash_context = MultipleFormatDirectoryHashContext(hash_format_list)
+
+        for child, file_hash_lookup in zip(children, file_hash_lookups):
+            file_path = child.path
+            if child.is_dir:
+                relative_path = child.relative_path
                 history, history_relative_path = existing_history.find_history_for_path(relative_path)
                 # check if there are directory hashes in the generations
                 directory_hash_entries = history.find_directory_hash_entries_for_path(history_relative_path)
@@ -763,17 +823,8 @@ def verify_directory_hash_subcommand(
                 content_hash_lookup = dir_content_hash_mappings.pop(file_path)
                 structure_hash_lookup = dir_structure_hash_mappings.pop(file_path)
 
-                # Add the content and hash values to the appropriate context
-                if dir_hash_context_lookup:
-                    for hash_format, dir_hash_context in dir_hash_context_lookup.items():
-                        content_hash = None
-                        structure_hash = None
-                        if content_hash_lookup:
-                            content_hash = content_hash_lookup[hash_format]
-                        if structure_hash_lookup:
-                            structure_hash = structure_hash_lookup[hash_format]
-
-                        dir_hash_context.append_directory_hashes(file_path, content_hash, structure_hash)
+                # Add the content and hash values to the context
+                dir_hash_context.append_directory_hashes(file_path, content_hash_lookup, structure_hash_lookup)
 
                 num_successful_verifications = 0
                 for directory_hash_entry in directory_hash_entries:
@@ -811,30 +862,16 @@ def verify_directory_hash_subcommand(
                             num_failed_verifications += 1
                             add_detected_failure_for_format(directory_hash_entry.hash_format)
             else:
-                # generate the hashes for the file
-                file_hash_lookup = multiple_format_hash_file(file_path, hash_format_list)
-                # add each hash to the appropriate context
-                for hash_format, hash_value in file_hash_lookup.items():
-                    dir_hash_context_lookup[hash_format].append_file_hash(file_path, hash_value)
+                dir_hash_context.append_file_hashes(file_path, file_hash_lookup)
 
         # all children have been handled.  create the directory hashes
-        dir_content_hash_lookup = {}
-        dir_structure_hash_lookup = {}
+        dir_content_hash_lookup = dir_hash_context.final_content_digest_lookup()
+        dir_structure_hash_lookup = dir_hash_context.final_structure_digest_lookup()
+        # add the hash lookups to the appropriate mappings for the folder
+        dir_content_hash_mappings[folder_path] = dir_content_hash_lookup
+        dir_structure_hash_mappings[folder_path] = dir_structure_hash_lookup
 
-        if dir_hash_context_lookup:
-            for hash_format, dir_hash_context in dir_hash_context_lookup.items():
-                dir_content_hash = dir_hash_context.final_content_hash_str()
-                dir_structure_hash = dir_hash_context.final_structure_hash_str()
-                # add the hashes to the appropriate hash lookups to be added to the session
-                dir_content_hash_lookup[hash_format] = dir_content_hash
-                dir_structure_hash_lookup[hash_format] = dir_structure_hash
-            # add the hash lookups to the appropriate mappings for the folder
-            if dir_content_hash_lookup:
-                dir_content_hash_mappings[folder_path] = dir_content_hash_lookup
-            if dir_structure_hash_lookup:
-                dir_structure_hash_mappings[folder_path] = dir_structure_hash_lookup
-
-        modification_date = datetime.datetime.fromtimestamp(os.path.getmtime(folder_path))
+        modification_date = datetime.datetime.fromtimestamp(folder.stat().st_mtime)
 
         logger.verbose_logging = calculate_only
         relative_path = session.root_history.get_relative_file_path(folder_path)
@@ -885,15 +922,18 @@ def verify_directory_hash_subcommand(
 
 
 def _compare_and_log_directory_hashes(
-    relative_path, directory_hash_entry, calculated_content_hash_string, calculated_structure_hash_string
+    relative_path,
+    directory_hash_entry,
+    calculated_content_digest: HashDigest,
+    calculated_structure_digest: HashDigest,
 ):
     num_successful_verifications = 0
     root_string = ""
     if hasattr(directory_hash_entry, "temp_is_root_folder") and directory_hash_entry.temp_is_root_folder:
         root_string = " (root folder in child history)"
     if (
-        directory_hash_entry.hash_string == calculated_content_hash_string
-        and directory_hash_entry.structure_hash_string == calculated_structure_hash_string
+        directory_hash_entry.digest == calculated_content_digest
+        and directory_hash_entry.structure_digest == calculated_structure_digest
     ):
         if relative_path == ".":
             logger.verbose(
@@ -907,11 +947,11 @@ def _compare_and_log_directory_hashes(
 
         num_successful_verifications += 2
     else:
-        if directory_hash_entry.hash_string != calculated_content_hash_string:
+        if directory_hash_entry.digest != calculated_content_digest:
             logger.error(
                 f"ERROR: content hash mismatch   for {relative_path}{root_string} "
                 f"old {directory_hash_entry.hash_format}: {directory_hash_entry.hash_string}, "
-                f"new {directory_hash_entry.hash_format}: {calculated_content_hash_string} "
+                f"new {directory_hash_entry.hash_format}: {calculated_content_digest} "
                 f"(generation {directory_hash_entry.temp_generation_number:04d})"
             )
         else:
@@ -921,11 +961,11 @@ def _compare_and_log_directory_hashes(
                 f" (generation {directory_hash_entry.temp_generation_number:04d})"
             )
 
-        if directory_hash_entry.structure_hash_string != calculated_structure_hash_string:
+        if directory_hash_entry.structure_digest != calculated_structure_digest:
             logger.error(
                 f"ERROR: structure hash mismatch for {relative_path}{root_string} "
                 f"old {directory_hash_entry.hash_format}: {directory_hash_entry.structure_hash_string}, "
-                f"new {directory_hash_entry.hash_format}: {calculated_structure_hash_string} "
+                f"new {directory_hash_entry.hash_format}: {calculated_structure_digest} "
                 f"(generation {directory_hash_entry.temp_generation_number:04d})"
             )
         else:
@@ -954,14 +994,62 @@ def _compare_and_log_directory_hashes(
     required=True,
     help="Algorithm",
 )
-def hash(file_path, hash_format):
+@click.option(
+    "--hash_backend",
+    default=None,
+    help="Implementation of the algorithm, see --benchmark for the installed ones",
+)
+@click.option(
+    "--benchmark",
+    default=False,
+    is_flag=True,
+    help="Compare the speed of all installed implementations of the algorithm on the file",
+)
+def hash(file_path, hash_format, hash_backend, benchmark):
     """
     Create and print a hash value for a file
     """
+    if benchmark:
+        benchmark_hash_backends(file_path, hash_format)
+        return
+
+    if hash_backend is not None:
+        if hash_backend not in hash_backend_names(hash_format):
+            raise click.BadParameter(
+                f"available for {hash_format}: {', '.join(hash_backend_names(hash_format))}",
+                param_hint="--hash_backend",
+            )
+        select_hash_backend(hash_format, hash_backend)
     result = hash_file(file_path, hash_format)
     logger.info(hash_format + " (" + file_path + ") = " + result)
 
 
+def benchmark_hash_backends(file_path, hash_format, repetitions=3):
+    """
+    Hashes a file with all registered backends of a hash format and prints their throughput.
+    Each backend hashes the file multiple times after the file has been read once, so all backends
+    hash the file from the page cache (if it fits into memory) and the fastest run is printed.
+    """
+    file_size = os.path.getsize(file_path)
+    hash_file(file_path, hash_format)
+
+    hash_strings = set()
+    for backend_name in hash_backend_names(hash_format):
+        durations = []
+        for _ in range(repetitions):
+            hasher = new_hasher_for_hash_type(hash_format, backend_name)
+            start = time.perf_counter()
+            update_hashers_from_file([hasher], file_path)
+            hash_string = hasher.string_digest()
+            durations.append(time.perf_counter() - start)
+        hash_strings.add(hash_string)
+        throughput = file_size / max(min(durations), 1e-9) / (1024 * 1024)
+        logger.info(f"{hash_format} {backend_name.ljust(14)} {throughput:10.1f} MB/s  {hash_string}")
+
+    if len(hash_strings) > 1:
+        raise click.ClickException(f"the {hash_format} backends computed different hashes")
+
+
 @click.command()
 @click.argument("root_path", type=click.Path(exists=True))
 @click.option(
@@ -985,7 +1073,14 @@ def hash(file_path, hash_format):
     type=click.Path(exists=True),
     help="A file containing multiple file patterns to ignore.",
 )
-def diff(root_path, verbose, ignore_list, ignore_spec_file):
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of folders that are listed in parallel",
+)
+def diff(root_path, verbose, ignore_list, ignore_spec_file, jobs):
     """
     Diff an entire folder structure
 
@@ -996,11 +1091,13 @@ def diff(root_path, verbose, ignore_list, ignore_spec_file):
     in the file system are reported as errors. No new ASC MHL file / generation
     is created.
     """
-    diff_entire_folder_against_full_history_subcommand(root_path, verbose, ignore_list, ignore_spec_file)
+    diff_entire_folder_against_full_history_subcommand(root_path, verbose, ignore_list, ignore_spec_file, jobs)
     return
 
 
-def diff_entire_folder_against_full_history_subcommand(root_path, verbose, ignore_list=None, ignore_spec_file=None):
+def diff_entire_folder_against_full_history_subcommand(
+    root_path, verbose, ignore_list=None, ignore_spec_file=None, jobs=1
+):
     """
     Checks MHL hashes from all generations against all file hash entries.
 
@@ -1017,38 +1114,40 @@ def diff_entire_folder_against_full_history_subcommand(root_path, verbose, ignor
 
     logger.verbose(f"check folder at path: {root_path}")
 
-    existing_history = MHLHistory.load_from_path(root_path)
+    # child histories that aren't referenced in the history yet are loaded while traversing the folder
+    existing_history = MHLHistory.load_from_path(root_path, jobs=jobs, find_child_histories=False)
+    loaded_child_histories = []
 
     if len(existing_history.hash_lists) == 0:
         raise errors.NoMHLHistoryException(root_path)
 
     # we collect all paths we expect to find first and remove every path that we actually found while
     # traversing the file system, so this set will at the end contain the file paths not found in the file system
-    not_found_paths = existing_history.set_of_file_paths()
-    renamed_files = existing_history.renamed_path_with_previous_path()
-    not_found_paths = {p if renamed_files.get(p, None) is None else renamed_files[p] for p in not_found_paths}
+    not_found_paths = _recorded_file_paths(existing_history)
 
     num_failed_verifications = 0
     num_new_files = 0
 
     ignore_spec = ignore.MHLIgnoreSpec(existing_history.latest_ignore_patterns(), ignore_list, ignore_spec_file)
 
-    for folder_path, children in post_order_lexicographic(root_path, ignore_spec.get_path_spec()):
-        for item_name, is_dir in children:
-            file_path = os.path.join(folder_path, item_name)
-            not_found_paths.discard(file_path)
-            relative_path = existing_history.get_relative_file_path(file_path)
-            history, history_relative_path = existing_history.find_history_for_path(relative_path)
-            if is_dir:
+    folder_chunks = post_order_lexicographic_entries(
+        root_path,
+        ignore_spec.get_path_spec(),
+        jobs,
+        _child_history_loader(existing_history, loaded_child_histories),
+    )
+    for _, children in folder_chunks:
+        # the child histories are loaded before their folders are traversed, also expect their recorded files
+        while loaded_child_histories:
+            not_found_paths.update(_recorded_file_paths(loaded_child_histories.pop()))
+        for child in children:
+            not_found_paths.discard(child.path)
+            if child.is_dir:
                 # TODO: find new directories here
                 continue
 
-            for hash_list in existing_history.hash_lists:
-                for media_hash in hash_list.media_hashes:
-                    if media_hash.path != history_relative_path:
-                        continue
-                    history_relative_path = media_hash.previous_path or history_relative_path
-                    break
+            relative_path = child.relative_path
+            history, history_relative_path = _find_history_and_original_path(existing_history, relative_path)
 
             # check if there is an existing hash in the other generations and verify
             original_hash_entry = history.find_original_hash_entry_for_path(history_relative_path)
@@ -1210,7 +1309,7 @@ def flatten_history(
                                 media_hash.file_size,
                                 media_hash.last_modification_date,
                                 hash_entry.hash_format,
-                                hash_entry.hash_string,
+                                hash_entry.digest,
                                 action=hash_entry.action,
                                 hash_date=hash_entry.hash_date,
                             )
@@ -1226,7 +1325,7 @@ def flatten_history(
                                     media_hash.file_size,
                                     media_hash.last_modification_date,
                                     hash_entry.hash_format,
-                                    hash_entry.hash_string,
+                                    hash_entry.digest,
                                     action=hash_entry.action,
                                     hash_date=hash_entry.hash_date,
                                 )
@@ -1291,7 +1390,7 @@ def info_for_entire_history(root_path, verbose):
 
     logger.info(f"Info with history at path: {root_path}")
 
-    existing_history = MHLHistory.load_from_path(root_path)
+    existing_history = MHLHistory.load_from_path(root_path, lazy=True)
 
     if len(existing_history.hash_lists) == 0:
         raise errors.NoMHLHistoryException(root_path)
@@ -1329,6 +1428,7 @@ def info_for_single_file(root_path, verbose, single_file):
 
     logger.info(f"Info with history at path: {root_path}")
 
+    # the path is looked up in every generation, so the hashes of all generations are needed anyway
     existing_history = MHLHistory.load_from_path(root_path)
 
     if len(existing_history.hash_lists) == 0:
@@ -1414,10 +1514,48 @@ def xsd_schema_check(file_path, directory_file, xsd_file):
         raise errors.VerificationFailedException
 
 
+def _find_history_and_original_path(existing_history, relative_path):
+    """
+    Finds the (child) history of a file path and the relative path the file was recorded with originally,
+    following renames recorded in the generations of the existing history
+    :param relative_path: The path of the file relative to the root of the existing history
+    :return: A tuple of the history and the relative path in that history
+    """
+    history, history_relative_path = existing_history.find_history_for_path(relative_path)
+    return history, existing_history.find_original_path_for_path(history_relative_path)
+
+
+def _recorded_file_paths(history):
+    """
+    Collects the paths recorded in a history and its child histories, with the latest paths of renamed files
+    :return: A set of absolute paths
+    """
+    file_paths = history.set_of_file_paths()
+    renamed_files = history.renamed_path_with_previous_path()
+    return {p if renamed_files.get(p, None) is None else renamed_files[p] for p in file_paths}
+
+
+def _child_history_loader(existing_history, loaded_child_histories):
+    """
+    Returns a callback for the traversal that loads the child histories which aren't loaded with the existing history
+    yet (because they aren't referenced in it), before the traversal reaches the files of the child histories
+    :param loaded_child_histories: A list the loaded child histories are appended to
+    """
+
+    def load_child_history(folder):
+        child_history = existing_history.load_child_history(folder.path)
+        if child_history is not None:
+            loaded_child_histories.append(child_history)
+
+    return load_child_history
+
+
 def test_for_missing_files(not_found_paths, root_path, ignore_spec: MHLIgnoreSpec = MHLIgnoreSpec()):
-    ignore_path_spec = ignore_spec.get_path_spec()
-    # update to exclude our ignored files
-    not_found_paths = [x for x in not_found_paths if not ignore_path_spec.match_file(x)]
+    ignore_matcher = ignore_spec.get_matcher()
+    # update to exclude our ignored files (also the files in ignored folders, which haven't been traversed)
+    not_found_paths = [
+        x for x in not_found_paths if not ignore_matcher.match_with_parents(os.path.relpath(x, root_path))
+    ]
     if len(not_found_paths) == 0:
         return None
     # test our not_found_paths against our ignore spec to ensure these weren't explicitly ignored.
@@ -1470,13 +1608,94 @@ def commit_session_for_collection(
 """
 A tuple for returning the result of a seal file path operation
 attributes:
-hash_value -- string value, a hash
+hash_value -- HashDigest, a hash
 success -- boolean value, indicates if the update was successful
 """
 SealPathResult = namedtuple("SealPathResult", ["hash_value", "success"])
 
 
-def seal_file_path(existing_history, file_path, hash_formats: [str], session) -> Dict[str, SealPathResult]:
+def _detect_renamed_paths(existing_history, session, new_paths, not_found_paths, missing_asc_mhl_folder, io_backend):
+    """
+    finds the not found paths that have the same hash as a new path and records them as previous path of the new path
+
+    the not found paths are looked up by the hash of their first hash entry, so each new path only needs one lookup
+    per hash format. new files without a hash entry in a needed format are hashed (once) in all missing formats.
+    :return: the set of not found paths that have been detected as renamed
+    """
+    # multimap of the missing paths by (hash format, digest) of their first hash entry
+    not_found_paths_by_digest = {}
+    for not_found_path in not_found_paths:
+        not_found_path_history, relative_not_found_path = existing_history.find_history_for_path(
+            existing_history.get_relative_file_path(not_found_path)
+        )
+        not_found_path_hash = not_found_path_history.find_first_hash_entry_for_path(relative_not_found_path)
+        if not_found_path_hash is None:
+            continue
+        not_found_paths_by_digest.setdefault((not_found_path_hash.hash_format, not_found_path_hash.digest), []).append(
+            (not_found_path, relative_not_found_path)
+        )
+    needed_hash_formats = sorted({hash_format for hash_format, _ in not_found_paths_by_digest})
+
+    found_file_paths = set()
+    for new_path in new_paths:
+        new_path_history, new_path_media_hash = None, None
+        for history, hash_list in session.new_hash_lists.items():
+            new_path_media_hash = hash_list.find_media_hash_for_path(history.get_relative_file_path(new_path))
+            if new_path_media_hash is not None:
+                new_path_history = history
+                break
+        if new_path_media_hash is None:
+            continue
+
+        new_path_digests = {}
+        for hash_format in needed_hash_formats:
+            new_path_hash = new_path_media_hash.find_hash_entry_for_format(hash_format)
+            if new_path_hash is not None:
+                new_path_digests[hash_format] = new_path_hash.digest
+        missing_hash_formats = [
+            hash_format for hash_format in needed_hash_formats if hash_format not in new_path_digests
+        ]
+        if missing_hash_formats and not new_path_media_hash.is_directory:
+            new_path_digests.update(
+                multiple_format_hash_file_digests(new_path, missing_hash_formats, io_backend=io_backend)
+            )
+
+        for hash_format, new_path_digest in new_path_digests.items():
+            for not_found_path, relative_not_found_path in not_found_paths_by_digest.get(
+                (hash_format, new_path_digest), []
+            ):
+                if os.path.basename(new_path) != os.path.basename(not_found_path):
+                    logger.info(
+                        "a renamed {} was detected: from {} to {}".format(
+                            "folder" if os.path.isdir(new_path) else "file",
+                            relative_not_found_path,
+                            existing_history.get_relative_file_path(new_path),
+                        )
+                    )
+                if new_path_media_hash.path == ".":
+                    root_hash = session.new_hash_lists[new_path_history.parent_history].find_media_hash_for_path(
+                        new_path_history.parent_history.get_relative_file_path(new_path)
+                    )
+                    if root_hash:
+                        root_hash.previous_path = relative_not_found_path
+                else:
+                    new_path_media_hash.previous_path = relative_not_found_path
+                if not_found_path in missing_asc_mhl_folder:
+                    missing_asc_mhl_folder.discard(not_found_path)
+                    if not os.path.exists(os.path.join(new_path, ascmhl_folder_name)):
+                        missing_asc_mhl_folder.add(new_path)
+                found_file_paths.add(not_found_path)
+    return found_file_paths
+
+
+def seal_file_path(
+    existing_history,
+    file_path,
+    hash_formats: [str],
+    session,
+    current_hash_lookup: Dict[str, HashDigest] = None,
+    file_stat: os.stat_result = None,
+) -> Dict[str, SealPathResult]:
     """
     Generates hashes for a file path.
     Compares the generated hashes to any existing hash records
@@ -1485,39 +1704,23 @@ def seal_file_path(existing_history, file_path, hash_formats: [str], session) ->
     :param file_path: The path for which to generate hashes
     :param hash_formats: The hash formats to generate
     :param session: The session to which the generated hashes will be added
+    :param current_hash_lookup: The hashes of the file if they have already been generated with hash_file_path
+    :param file_stat: The stat result of the file if it's already known (e.g. from the traversal)
     :return: A dictionary keyed by hash_format strings.
     Each entry contains the hash value and a boolean indicating if updating was successful
     """
-    relative_path = existing_history.get_relative_file_path(file_path)
-    file_size = os.path.getsize(file_path)
-    file_modification_date = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
+    if file_stat is None:
+        file_stat = os.stat(file_path)
+    file_size = file_stat.st_size
+    file_modification_date = datetime.datetime.fromtimestamp(file_stat.st_mtime)
 
-    # find in the according child history the already available hash formats
-    existing_child_history, existing_history_relative_path = existing_history.find_history_for_path(relative_path)
-    existing_hash_formats = existing_child_history.find_existing_hash_formats_for_path(existing_history_relative_path)
-
-    # create a separate list of hash formats for which hashes will be generated
-    hash_formats_to_generate = []
-
-    # if there are existing entries for this path, the recorded formats must also be generated
-    if existing_hash_formats and len(existing_hash_formats) > 0:
-        # existing hash formats should be verified prior to any new formats
-        for hash_format in existing_hash_formats:
-            if hash_format in hash_formats:
-                hash_formats_to_generate.append(hash_format)
-        # if no formats are being carried over from the previous generation to this one, at least
-        # one of the previous generation hashes needs to at least be verified as correct
-        # TODO: Consider making the selection of the previous generation bench mark format less arbitrary
-        # TODO: Instead of selecting the first format, perhaps choose the most efficient or robust format
-        if not hash_formats_to_generate or len(hash_formats_to_generate) == 0:
-            hash_formats_to_generate.append(existing_hash_formats[0])
-
-    for hash_format in hash_formats:
-        if hash_format not in hash_formats_to_generate:
-            hash_formats_to_generate.append(hash_format)
+    existing_hash_formats, hash_formats_to_generate = _hash_formats_for_file_path(
+        existing_history, file_path, hash_formats
+    )
 
     # generate the file hashes
-    current_hash_lookup = multiple_format_hash_file(file_path, hash_formats_to_generate)
+    if current_hash_lookup is None:
+        current_hash_lookup = multiple_format_hash_file_digests(file_path, hash_formats_to_generate)
 
     # the lookup where the results will be stored
     hash_result_lookup = {}
@@ -1565,3 +1768,53 @@ def seal_file_path(existing_history, file_path, hash_formats: [str], session) ->
             hash_result_lookup[hash_format] = SealPathResult(current_hash_lookup[hash_format], success)
 
     return hash_result_lookup
+
+
+def hash_file_path(
+    existing_history, file_path, hash_formats: [str], io_backend: IOBackend = None
+) -> Dict[str, HashDigest]:
+    """
+    Generates the hashes seal_file_path needs for a file path, without adding them to a session.
+    Only reads from the history, so it can be called from worker threads.
+    :param existing_history: The existing hash record
+    :param file_path: The path for which to generate hashes
+    :param hash_formats: The requested hash formats
+    :param io_backend: The IOBackend used for reading the file, defaults to the default io backend of the hasher
+    :return: A dictionary of HashDigests keyed by hash_format strings, including already recorded formats
+    """
+    _, hash_formats_to_generate = _hash_formats_for_file_path(existing_history, file_path, hash_formats)
+    return multiple_format_hash_file_digests(file_path, hash_formats_to_generate, io_backend=io_backend)
+
+
+def _hash_formats_for_file_path(existing_history, file_path, hash_formats: [str]) -> Tuple[List[str], List[str]]:
+    """
+    Determines the hash formats that need to be generated for a file path
+    :return: A tuple of the hash formats already recorded in the history and the hash formats to generate
+    """
+    relative_path = existing_history.get_relative_file_path(file_path)
+
+    # find in the according child history the already available hash formats
+    existing_child_history, existing_history_relative_path = existing_history.find_history_for_path(relative_path)
+    existing_hash_formats = existing_child_history.find_existing_hash_formats_for_path(existing_history_relative_path)
+
+    # create a separate list of hash formats for which hashes will be generated
+    hash_formats_to_generate = []
+
+    # if there are existing entries for this path, the recorded formats must also be generated
+    if existing_hash_formats and len(existing_hash_formats) > 0:
+        # existing hash formats should be verified prior to any new formats
+        for hash_format in existing_hash_formats:
+            if hash_format in hash_formats:
+                hash_formats_to_generate.append(hash_format)
+        # if no formats are being carried over from the previous generation to this one, at least
+        # one of the previous generation hashes needs to at least be verified as correct
+        # TODO: Consider making the selection of the previous generation bench mark format less arbitrary
+        # TODO: Instead of selecting the first format, perhaps choose the most efficient or robust format
+        if not hash_formats_to_generate or len(hash_formats_to_generate) == 0:
+            hash_formats_to_generate.append(existing_hash_formats[0])
+
+    for hash_format in hash_formats:
+        if hash_format not in hash_formats_to_generate:
+            hash_formats_to_generate.append(hash_format)
+
+    return existing_hash_formats, hash_formats_to_generate
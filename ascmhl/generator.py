@@ -8,11 +8,12 @@ __email__ = "opensource@pomfort.com"
 """
 
 from collections import defaultdict
-from typing import Dict, List
+from typing import Dict, List, Union
 
 from . import chain_xml_parser
 from . import logger
 from .ignore import MHLIgnoreSpec
+from .hasher import HashDigest
 from .hashlist import MHLHashList, MHLHashEntry, MHLCreatorInfo, MHLProcessInfo
 from .history import MHLHistory
 
@@ -42,13 +43,19 @@ class MHLGenerationCreationSession:
         self.ignore_spec = ignore_spec
 
     def append_multiple_format_file_hashes(
-        self, file_path, file_size, hash_lookup: Dict[str, str], file_modification_date, action=None, hash_date=None
+        self,
+        file_path,
+        file_size,
+        hash_lookup: Dict[str, Union[str, HashDigest]],
+        file_modification_date,
+        action=None,
+        hash_date=None,
     ) -> bool:
         """
         Adds file hashes to the history
         :param file_path: a string value representing the path to a file
         :param file_size: size of the file path in bytes
-        :param hash_lookup: a dictionary of hash values keyed by the respective hash format
+        :param hash_lookup: a dictionary of hash values (strings or HashDigests) keyed by the respective hash format
         :param file_modification_date: date the file was last modified
         :param action: a predetermined action for the entry.  defaults to none
         :param hash_date: date the hashes were generated
@@ -77,7 +84,7 @@ class MHLGenerationCreationSession:
             else:
                 existing_hash_entry = history.find_first_hash_entry_for_path(history_relative_path, hash_format)
                 if existing_hash_entry is not None:
-                    if existing_hash_entry.hash_string == hash_string:
+                    if existing_hash_entry.digest == hash_entry.digest:
                         hash_entry.action = "verified"
                         logger.verbose(f"  verified                      {relative_path} {hash_format}: OK")
                     else:
@@ -135,7 +142,7 @@ class MHLGenerationCreationSession:
         else:
             existing_hash_entry = history.find_first_hash_entry_for_path(history_relative_path, hash_format)
             if existing_hash_entry is not None:
-                if existing_hash_entry.hash_string == hash_string:
+                if existing_hash_entry.digest == hash_entry.digest:
                     hash_entry.action = "verified"
                     logger.verbose(f"  verified                      {relative_path}  {hash_format}: OK")
                 else:
@@ -164,14 +171,18 @@ class MHLGenerationCreationSession:
         return hash_entry.action != "failed"
 
     def append_multiple_format_directory_hashes(
-        self, path, modification_date, content_hash_lookup: Dict[str, str], structure_hash_lookup: Dict[str, str]
+        self,
+        path,
+        modification_date,
+        content_hash_lookup: Dict[str, Union[str, HashDigest]],
+        structure_hash_lookup: Dict[str, Union[str, HashDigest]],
     ) -> None:
         """
         Adds directory hashes to the history
         :param path: a string value representing the path to a file
         :param modification_date: date the file was last modified
-        :param content_hash_lookup: a dictionary of content hash values keyed by the respective hash format
-        :param structure_hash_lookup: a dictionary of structure hash values keyed by the respective hash format
+        :param content_hash_lookup: a dictionary of content hash values (strings or HashDigests) keyed by hash format
+        :param structure_hash_lookup: a dictionary of structure hash values (strings or HashDigests) keyed by hash format
         :return: none
         """
         relative_path = self.root_history.get_relative_file_path(path)
@@ -9,12 +9,114 @@ __email__ = "opensource@pomfort.com"
 
 import binascii
 import hashlib
+import io
+import mmap
+import queue
+import stat
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+try:
+    from cryptography.hazmat.primitives import hashes as cryptography_hashes
+except ImportError:  # optional, provides additional OpenSSL based hash backends
+    cryptography_hashes = None
 
 import xxhash
 import os
 from enum import Enum, unique
 from abc import ABC, abstractmethod
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from typing import Callable, Dict, List, Union
+
+# files are read and hashed in chunks of this size, so that large files won't cause excessive memory consumption.
+# fast storage benefits from larger chunks, it can be changed here or passed to the hash_file functions.
+default_chunk_size = 1024 * 1024  # 1MB
+# files of at least this size are hashed in all formats in parallel when hashing multiple formats, for smaller files
+# the synchronization of the hashing threads for each chunk costs more than it saves
+parallel_hashing_min_file_size = 16 * 1024 * 1024  # 16MB
+
+
+@unique
+class IOBackend(Enum):
+    """
+    IOBackend wraps the different ways files are read for hashing.
+
+    mmap is opt-in only: if a mapped file is truncated while it is hashed (e.g. by another process, or a network
+    file system or removable drive going away), accessing the missing pages kills the process with SIGBUS instead of
+    raising an OSError for the file.
+    """
+
+    buffered = "buffered"  # reads into buffers, ahead of hashing in a background thread
+    mmap = "mmap"  # memory maps the file and hashes it without copying, see above for truncated files
+    uncached = "uncached"  # buffered reads that drop hashed chunks from the page cache (posix_fadvise)
+    direct = "direct"  # aligned O_DIRECT reads that bypass the page cache, where supported
+
+
+# the io backend that is used if none is passed to the hash_file functions
+default_io_backend = IOBackend.buffered
+
+
+class HashDigest:
+    """
+    HashDigest holds a hash value of a hash format as raw digest bytes and/or as hash string.
+
+    the representation that is missing is only computed (and then kept) when it's needed, so digests of hashed files
+    are only encoded when they are written or logged and hash strings of parsed files are only decoded for
+    directory hashing. digests are equal if they have the same format and the same value.
+    """
+
+    __slots__ = ("hash_format", "_digest_bytes", "_hash_string")
+
+    def __init__(self, hash_format: str, digest_bytes: bytes = None, hash_string: str = None):
+        self.hash_format = hash_format
+        self._digest_bytes = digest_bytes
+        self._hash_string = hash_string
+
+    @classmethod
+    def from_value(cls, hash_format: str, value):
+        """
+        returns a HashDigest for a hash string, a HashDigest is returned as is and None stays None
+        """
+        if value is None or isinstance(value, HashDigest):
+            return value
+        return cls(hash_format, hash_string=value)
+
+    @property
+    def digest_bytes(self) -> bytes:
+        if self._digest_bytes is None:
+            self._digest_bytes = HashType[self.hash_format].value.bytes_from_string_digest(self._hash_string)
+        return self._digest_bytes
+
+    @property
+    def hash_string(self) -> str:
+        if self._hash_string is None:
+            self._hash_string = HashType[self.hash_format].value.string_from_bytes_digest(self._digest_bytes)
+        return self._hash_string
+
+    def __str__(self):
+        return self.hash_string
+
+    def __repr__(self):
+        return f"HashDigest({self.hash_format}: {self.hash_string})"
+
+    def __eq__(self, other):
+        if not isinstance(other, HashDigest):
+            return NotImplemented
+        if self.hash_format != other.hash_format:
+            return False
+        # avoid encoding or decoding if both digests already have the same representation
+        if self._digest_bytes is not None and other._digest_bytes is not None:
+            return self._digest_bytes == other._digest_bytes
+        return self.hash_string == other.hash_string
+
+    def __hash__(self):
+        return hash((self.hash_format, self.digest_bytes))
 
 
 class Hasher(ABC):
@@ -23,9 +125,9 @@ class Hasher(ABC):
     This abstraction is primarily necessary due to some discrepancies in the hash encoding of C4ID.
     """
 
-    def __init__(self):
-        # instantiate our internal hash generator. such as: hashlib.md5 or xxhash.xxh64
-        self.hasher = self.hashlib_type()()
+    def __init__(self, backend_name: str = None):
+        # instantiate our internal hash generator from the selected (or given) hash backend, such as hashlib.md5
+        self.hasher = hash_backend(self.hash_format, backend_name)()
 
     def update(self, data: bytes) -> None:
         """
@@ -40,6 +142,12 @@ class Hasher(ABC):
         """
         pass
 
+    def digest(self) -> HashDigest:
+        """
+        get the digest of the current state of the internal hasher without encoding it
+        """
+        return HashDigest(self.hash_format, self.hasher.digest())
+
     @classmethod
     @abstractmethod
     def bytes_from_string_digest(cls, hash_string: str) -> bytes:
@@ -48,12 +156,20 @@ class Hasher(ABC):
         """
         pass
 
+    @classmethod
+    @abstractmethod
+    def string_from_bytes_digest(cls, digest_bytes: bytes) -> str:
+        """
+        helper to convert the byte representation of a hash to its hash string adhering to the encoding of the hash_type.
+        """
+        pass
+
     @staticmethod
     @abstractmethod
     def hashlib_type():
         """
         returns the underlying wrapped hasher type from either the hashlib or xxhash libraries.
-        such as: hashlib.md5 or xxhash.xxh64
+        such as: hashlib.md5 or xxhash.xxh64. it's registered as the default hash backend of the format.
         """
         pass
 
@@ -76,23 +192,17 @@ class Hasher(ABC):
         return hasher.string_digest()
 
     @classmethod
-    def hash_file(cls, filepath: str) -> str:
+    def hash_file(cls, filepath: str, chunk_size: int = None, io_backend: IOBackend = None) -> str:
         """
         computes and returns a new hash string for a file
 
         arguments:
         filepath -- string value, path of file to generate hash for.
-        hash_format -- string value, one of the supported hash formats, e.g. 'md5', 'xxh64'
+        chunk_size -- size of the chunks the file is read in, defaults to default_chunk_size
+        io_backend -- IOBackend used for reading the file, defaults to default_io_backend
         """
         hasher = cls()
-        with open(filepath, "rb") as fd:
-            # process files in chunks so that large files won't cause excessive memory consumption.
-            size = 1024 * 1024  # chunk size 1MB
-            chunk = fd.read(size)
-            while chunk:
-                hasher.update(chunk)
-                chunk = fd.read(size)
-
+        update_hashers_from_file([hasher], filepath, chunk_size, io_backend)
         return hasher.string_digest()
 
     @classmethod
@@ -122,12 +232,18 @@ class HexHasher(Hasher, ABC):
     def bytes_from_string_digest(cls, hash_string: str) -> bytes:
         return binascii.unhexlify(hash_string)
 
+    @classmethod
+    def string_from_bytes_digest(cls, digest_bytes: bytes) -> str:
+        return digest_bytes.hex()
+
 
 class MD5(HexHasher):
     """
     md5 checksum generator.
     """
 
+    hash_format = "md5"
+
     @staticmethod
     def hashlib_type():
         return hashlib.md5
@@ -138,6 +254,8 @@ class SHA1(HexHasher):
     sha1 checksum generator.
     """
 
+    hash_format = "sha1"
+
     @staticmethod
     def hashlib_type():
         return hashlib.sha1
@@ -148,6 +266,8 @@ class XXH32(HexHasher):
     xxh32 checksum generator.
     """
 
+    hash_format = "xxh32"
+
     @staticmethod
     def hashlib_type():
         return xxhash.xxh32
@@ -158,6 +278,8 @@ class XXH64(HexHasher):
     xxh64 checksum generator.
     """
 
+    hash_format = "xxh64"
+
     @staticmethod
     def hashlib_type():
         return xxhash.xxh64
@@ -168,6 +290,8 @@ class XXH3(HexHasher):
     xxh3 checksum generator.
     """
 
+    hash_format = "xxh3"
+
     @staticmethod
     def hashlib_type():
         return xxhash.xxh3_64
@@ -178,6 +302,8 @@ class XXH128(HexHasher):
     xxh128 checksum generator.
     """
 
+    hash_format = "xxh128"
+
     @staticmethod
     def hashlib_type():
         return xxhash.xxh3_128
@@ -189,6 +315,7 @@ class C4(Hasher):
     C4 Hasher is different than the other supported hash algorithms in that it does not adhere to a hex char set.
     """
 
+    hash_format = "c4"
     # c4 has a different character set than the usual hex char set of other checksum types. encoding is different.
     charset = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"  # C4ID character set
 
@@ -197,36 +324,65 @@ class C4(Hasher):
         return hashlib.sha512
 
     def string_digest(self) -> str:
-        sha512_string = self.hasher.hexdigest()
+        return c4_string_from_digest(self.hasher.digest())
 
-        base58 = 58  # the encoding basis
-        c4id_length = 90  # the guaranteed length
-        zero = "1"  # '0' is not in the C4ID alphabet so '1' is zero
+    @classmethod
+    def bytes_from_string_digest(cls, hash_string: str) -> bytes:
+        return c4_digest_from_string(hash_string)
 
-        hash_value = int(sha512_string, 16)
-        c4_string = ""
-        while hash_value != 0:
-            modulo = hash_value % base58
-            hash_value = hash_value // base58
-            c4_string = C4.charset[modulo] + c4_string
+    @classmethod
+    def string_from_bytes_digest(cls, digest_bytes: bytes) -> str:
+        return c4_string_from_digest(digest_bytes)
 
-        c4_string = "c4" + c4_string.rjust(c4id_length - 2, zero)
-        return c4_string
 
-    @classmethod
-    def bytes_from_string_digest(cls, hash_string: str) -> bytes:
-        base58 = 58  # the encoding basis
-        c4id_length = 90  # the guaranteed length
-        result = 0
-        i = 2
+# a C4 ID is "c4" followed by the 512 bit SHA-512 digest as 88 base58 digits ('1' is zero), the codec works on
+# 11 digit groups (58^11 fits into 64 bits) and looks up two digits at once to keep the big integer arithmetic
+# and the number of python level operations per ID low
+_c4_id_length = 90
+_c4_base58_pairs = [first + second for first in C4.charset for second in C4.charset]
+_c4_base58_pair_values = {pair: value for value, pair in enumerate(_c4_base58_pairs)}
+_c4_base58_pair_base = 58**2
+_c4_base58_quad_base = 58**8
+_c4_base58_group_base = 58**11
 
-        while i < c4id_length:
-            temp = C4.charset.index(hash_string[i])
-            result = result * base58 + temp
-            i = i + 1
 
-        data = result.to_bytes(64, byteorder="big")
-        return data
+def c4_string_from_digest(digest: bytes) -> str:
+    """
+    encodes a SHA-512 digest (64 bytes) as C4 ID string
+    """
+    value = int.from_bytes(digest, byteorder="big")
+    pairs = _c4_base58_pairs
+    groups = []
+    for _ in range(8):
+        value, group = divmod(value, _c4_base58_group_base)
+        group, pair5 = divmod(group, _c4_base58_pair_base)
+        group, pair4 = divmod(group, _c4_base58_pair_base)
+        group, pair3 = divmod(group, _c4_base58_pair_base)
+        group, pair2 = divmod(group, _c4_base58_pair_base)
+        digit, pair1 = divmod(group, _c4_base58_pair_base)
+        groups.append(C4.charset[digit] + pairs[pair1] + pairs[pair2] + pairs[pair3] + pairs[pair4] + pairs[pair5])
+    groups.append("c4")
+    return "".join(reversed(groups))
+
+
+def c4_digest_from_string(c4_string: str) -> bytes:
+    """
+    decodes a C4 ID string to the SHA-512 digest (64 bytes) it encodes
+    """
+    if len(c4_string) != _c4_id_length:
+        raise ValueError(f"invalid C4 ID length: {c4_string}")
+    try:
+        values = [_c4_base58_pair_values[c4_string[i : i + 2]] for i in range(2, _c4_id_length, 2)]
+    except KeyError:
+        raise ValueError(f"invalid character in C4 ID: {c4_string}")
+
+    # combine four pairs (58^8 fits into 64 bits) before touching the big integer
+    pair_base = _c4_base58_pair_base
+    value = 0
+    for i in range(0, len(values), 4):
+        group = ((values[i] * pair_base + values[i + 1]) * pair_base + values[i + 2]) * pair_base + values[i + 3]
+        value = value * _c4_base58_quad_base + group
+    return value.to_bytes(64, byteorder="big")
 
 
 @unique
@@ -244,6 +400,93 @@ class HashType(Enum):
     c4 = C4
 
 
+# hash backends are the implementations behind the Hasher classes, keyed by hash format and backend name. a backend
+# is a constructor taking optional initial data that returns an object with update(), digest() and hexdigest() like
+# the hashlib and xxhash types. all backends of a format must compute identical hashes.
+_hash_backends: Dict[str, Dict[str, Callable]] = {}
+_selected_hash_backend_names: Dict[str, str] = {}
+
+
+def register_hash_backend(hash_format: str, backend_name: str, constructor: Callable, select: bool = False) -> None:
+    """
+    registers an implementation of a hash format, the first registered backend of a format is selected by default
+
+    arguments:
+    hash_format -- string value, one of the supported hash formats, e.g. 'md5', 'xxh64'
+    backend_name -- string value, name of the backend, e.g. 'hashlib'
+    constructor -- returns a new hash object of the backend, optionally with initial data
+    select -- use the backend for all new hashers of the format
+    """
+    _hash_backends.setdefault(hash_format, {})[backend_name] = constructor
+    if select or hash_format not in _selected_hash_backend_names:
+        _selected_hash_backend_names[hash_format] = backend_name
+
+
+def select_hash_backend(hash_format: str, backend_name: str) -> None:
+    """
+    uses a registered backend for all new hashers of a hash format
+    """
+    if backend_name not in hash_backend_names(hash_format):
+        raise ValueError(f"unknown hash backend {backend_name} for {hash_format}")
+    _selected_hash_backend_names[hash_format] = backend_name
+
+
+def selected_hash_backend_name(hash_format: str) -> str:
+    return _selected_hash_backend_names[hash_format]
+
+
+def hash_backend_names(hash_format: str) -> List[str]:
+    """
+    returns the names of the registered backends of a hash format
+    """
+    return list(_hash_backends.get(hash_format, {}).keys())
+
+
+def hash_backend(hash_format: str, backend_name: str = None) -> Callable:
+    """
+    returns the constructor of the given (or the selected) backend of a hash format
+    """
+    return _hash_backends[hash_format][backend_name or _selected_hash_backend_names[hash_format]]
+
+
+class _CryptographyHash:
+    """
+    adapts the hash contexts of the cryptography package to the hashlib interface, the digest can only be updated
+    until it has been read once
+    """
+
+    def __init__(self, algorithm, data: bytes = None):
+        self._context = cryptography_hashes.Hash(algorithm())
+        self._digest = None
+        if data:
+            self._context.update(data)
+
+    def update(self, data: bytes) -> None:
+        self._context.update(data)
+
+    def digest(self) -> bytes:
+        if self._digest is None:
+            self._digest = self._context.finalize()
+        return self._digest
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+
+register_hash_backend("md5", "hashlib", hashlib.md5)
+register_hash_backend("sha1", "hashlib", hashlib.sha1)
+register_hash_backend("xxh32", "xxhash", xxhash.xxh32)
+register_hash_backend("xxh64", "xxhash", xxhash.xxh64)
+register_hash_backend("xxh3", "xxhash", xxhash.xxh3_64)
+register_hash_backend("xxh128", "xxhash", xxhash.xxh3_128)
+register_hash_backend("c4", "hashlib", hashlib.sha512)
+
+if cryptography_hashes is not None:
+    register_hash_backend("md5", "cryptography", partial(_CryptographyHash, cryptography_hashes.MD5))
+    register_hash_backend("sha1", "cryptography", partial(_CryptographyHash, cryptography_hashes.SHA1))
+    register_hash_backend("c4", "cryptography", partial(_CryptographyHash, cryptography_hashes.SHA512))
+
+
 class AggregateHasher:
     def __init__(self, hash_formats: [str]):
         # Build a hasher for each format
@@ -259,13 +502,27 @@ class AggregateHasher:
     """
 
     @classmethod
-    def hash_file(cls, file_path: str, hash_formats: [str]) -> Dict[str, str]:
+    def hash_file(
+        cls, file_path: str, hash_formats: [str], chunk_size: int = None, io_backend: IOBackend = None
+    ) -> Dict[str, str]:
         """
         computes and returns new hash strings for a file
 
         arguments:
         file_path -- string value, path of file to generate hash for.
         hash_formats -- array string values, each entry should be one of the supported hash formats, e.g. 'md5', 'xxh64'
+        chunk_size -- size of the chunks the file is read in, defaults to default_chunk_size
+        io_backend -- IOBackend used for reading the file, defaults to default_io_backend
+        """
+        digest_lookup = cls.hash_file_digests(file_path, hash_formats, chunk_size, io_backend)
+        return {hash_format: digest.hash_string for hash_format, digest in digest_lookup.items()}
+
+    @classmethod
+    def hash_file_digests(
+        cls, file_path: str, hash_formats: [str], chunk_size: int = None, io_backend: IOBackend = None
+    ) -> Dict[str, HashDigest]:
+        """
+        computes and returns new (not yet encoded) digests for a file, arguments are the same as for hash_file
         """
 
         # Build a hasher for each supplied format
@@ -274,24 +531,15 @@ class AggregateHasher:
             hasher = new_hasher_for_hash_type(hash_format)
             hasher_lookup[hash_format] = hasher
 
-        # Open the file
-        with open(file_path, "rb") as fd:
-            # process files in chunks so that large files won't cause excessive memory consumption.
-            size = 1024 * 1024  # chunk size 1MB
-            chunk = fd.read(size)
-            while chunk:
-                # Update each stored hasher with the read chunk
-                for hash_format in hasher_lookup:
-                    hasher_lookup[hash_format].update(chunk)
-
-                chunk = fd.read(size)
+        # Update each stored hasher with the content of the file
+        update_hashers_from_file(list(hasher_lookup.values()), file_path, chunk_size, io_backend)
 
         # Get the digest from each hasher
-        hash_output_lookup = {}
+        digest_lookup = {}
         for hash_format in hasher_lookup:
-            hash_output_lookup[hash_format] = hasher_lookup[hash_format].string_digest()
+            digest_lookup[hash_format] = hasher_lookup[hash_format].digest()
 
-        return hash_output_lookup
+        return digest_lookup
 
     @classmethod
     def hash_data(cls, input_data: bytes, hash_formats: [str]) -> Dict[str, str]:
@@ -321,53 +569,404 @@ class DirectoryHashContext:
 
     def __init__(self, hash_format: str):
         self.hash_format = hash_format
-        self.hasher = new_hasher_for_hash_type(hash_format)
-        self.content_hash_strings = []
-        self.structure_hash_strings = []
+        self.context = MultipleFormatDirectoryHashContext([hash_format])
 
     def append_file_hash(self, path: str, content_hash_string: str):
         """
         append child file data to this directory context.
         """
-        self.content_hash_strings.append(content_hash_string)
-
-        # structure hashes are computed from lists of children name+hash strings
-        path_bytes = os.path.basename(os.path.normpath(path)).encode("utf8")
-        hash_bytes = self.hasher.bytes_from_string_digest(content_hash_string)
-        structure_hash = self.hasher.hash_data(path_bytes + hash_bytes)
-        self.structure_hash_strings.append(structure_hash)
+        self.context.append_file_hashes(path, {self.hash_format: content_hash_string})
 
     def append_directory_hashes(self, path: str, content_hash_string: str, structure_hash_string: str):
         """
         append child directory data to this directory context.
         """
-        self.content_hash_strings.append(content_hash_string)
-
-        # structure hashes are computed from lists of children name+hash strings
-        path_bytes = os.path.basename(os.path.normpath(path)).encode("utf8")
-        hash_bytes = self.hasher.bytes_from_string_digest(structure_hash_string)
-        structure_hash = self.hasher.hash_data(path_bytes + hash_bytes)
-        self.structure_hash_strings.append(structure_hash)
+        self.context.append_directory_hashes(
+            path, {self.hash_format: content_hash_string}, {self.hash_format: structure_hash_string}
+        )
 
     def final_content_hash_str(self):
         """
         compute and return the content hash of this directory context by hashing the child content hash list.
         """
-        return self.hasher.hash_of_hash_list(self.content_hash_strings)
+        return self.context.final_content_hash_lookup()[self.hash_format]
 
     def final_structure_hash_str(self):
         """
         compute and return the structure hash of this directory context by hashing the child structure hash list.
         """
-        return self.hasher.hash_of_hash_list(self.structure_hash_strings)
+        return self.context.final_structure_hash_lookup()[self.hash_format]
+
+
+class MultipleFormatDirectoryHashContext:
+    """
+    MultipleFormatDirectoryHashContext computes the directory checksums of one directory for multiple hash formats.
+
+    the child hashes (hash strings or HashDigests) are kept as raw digest bytes, so each child hash string is decoded
+    only once and the structure hashes of the children are computed without creating Hasher instances or hash strings.
+    """
+
+    def __init__(self, hash_formats: [str]):
+        self.hash_formats = hash_formats
+        self.hasher_types = {hash_format: HashType[hash_format].value for hash_format in hash_formats}
+        self.hash_backends = {hash_format: hash_backend(hash_format) for hash_format in hash_formats}
+        self.content_digests = {hash_format: [] for hash_format in hash_formats}
+        self.structure_digests = {hash_format: [] for hash_format in hash_formats}
+
+    def append_file_hashes(self, path: str, content_hash_lookup: Dict[str, Union[str, HashDigest]]):
+        """
+        append child file data (hash strings keyed by hash format) to this directory context.
+        """
+        path_bytes = os.path.basename(os.path.normpath(path)).encode("utf8")
+        for hash_format, hasher_type in self.hasher_types.items():
+            content_digest = _digest_bytes(hasher_type, content_hash_lookup[hash_format])
+            self.content_digests[hash_format].append(content_digest)
+            # structure hashes are computed from lists of children name+hash strings
+            structure_digest = self.hash_backends[hash_format](path_bytes + content_digest).digest()
+            self.structure_digests[hash_format].append(structure_digest)
+
+    def append_directory_hashes(
+        self,
+        path: str,
+        content_hash_lookup: Dict[str, Union[str, HashDigest]],
+        structure_hash_lookup: Dict[str, Union[str, HashDigest]],
+    ):
+        """
+        append child directory data (hash strings keyed by hash format) to this directory context.
+        """
+        path_bytes = os.path.basename(os.path.normpath(path)).encode("utf8")
+        for hash_format, hasher_type in self.hasher_types.items():
+            content_digest = _digest_bytes(hasher_type, content_hash_lookup[hash_format])
+            self.content_digests[hash_format].append(content_digest)
+            # structure hashes are computed from lists of children name+hash strings
+            child_structure_digest = _digest_bytes(hasher_type, structure_hash_lookup[hash_format])
+            structure_digest = self.hash_backends[hash_format](path_bytes + child_structure_digest).digest()
+            self.structure_digests[hash_format].append(structure_digest)
+
+    def final_content_hash_lookup(self) -> Dict[str, str]:
+        """
+        compute and return the content hashes of this directory context keyed by hash format.
+        """
+        return _hash_strings(self.final_content_digest_lookup())
+
+    def final_structure_hash_lookup(self) -> Dict[str, str]:
+        """
+        compute and return the structure hashes of this directory context keyed by hash format.
+        """
+        return _hash_strings(self.final_structure_digest_lookup())
+
+    def final_content_digest_lookup(self) -> Dict[str, HashDigest]:
+        """
+        compute and return the content hashes of this directory context as HashDigests keyed by hash format.
+        """
+        return self._hash_of_digest_lists(self.content_digests)
+
+    def final_structure_digest_lookup(self) -> Dict[str, HashDigest]:
+        """
+        compute and return the structure hashes of this directory context as HashDigests keyed by hash format.
+        """
+        return self._hash_of_digest_lists(self.structure_digests)
+
+    def _hash_of_digest_lists(self, digest_lists: Dict[str, List[bytes]]) -> Dict[str, HashDigest]:
+        digest_lookup = {}
+        for hash_format, hasher_type in self.hasher_types.items():
+            # same as Hasher.hash_of_hash_list: the digests of one format have the same length and the string
+            # encodings preserve the order, so sorting the digests sorts like the hash strings
+            hasher = hasher_type()
+            hasher.update(b"".join(sorted(digest_lists[hash_format])))
+            digest_lookup[hash_format] = hasher.digest()
+        return digest_lookup
+
+
+def _digest_bytes(hasher_type, hash_value: Union[str, HashDigest]) -> bytes:
+    if isinstance(hash_value, HashDigest):
+        return hash_value.digest_bytes
+    return hasher_type.bytes_from_string_digest(hash_value)
+
+
+def _hash_strings(digest_lookup: Dict[str, HashDigest]) -> Dict[str, str]:
+    return {hash_format: digest.hash_string for hash_format, digest in digest_lookup.items()}
+
+
+def update_hashers_from_file(
+    hashers: List[Hasher], file_path: str, chunk_size: int = None, io_backend: IOBackend = None
+) -> None:
+    """
+    reads a file once and updates all given hashers with its content
+
+    arguments:
+    hashers -- list of Hasher instances to update
+    file_path -- string value, path of the file to read
+    chunk_size -- size of the chunks the file is read in, defaults to default_chunk_size
+    io_backend -- IOBackend used for reading the file, defaults to default_io_backend
+    """
+    chunk_size = chunk_size or default_chunk_size
+    with open(file_path, "rb") as file:
+        file_stat = os.fstat(file.fileno())
+        chunks = _file_chunks_for_io_backend(io_backend or default_io_backend, file, file_path, file_stat, chunk_size)
+        with closing(chunks):
+            in_parallel = file_stat.st_size >= parallel_hashing_min_file_size and file_stat.st_size > chunk_size
+            _update_hashers_from_chunks(hashers, chunks, in_parallel)
+
+
+def _update_hashers_from_chunks(hashers: List[Hasher], chunks, in_parallel: bool) -> None:
+    """
+    updates all hashers with the chunks of one file
+    """
+    # with multiple hash formats each hasher runs on its own thread for large files,
+    # so hashing costs roughly the time of the slowest format instead of the sum of all formats
+    if len(hashers) > 1 and in_parallel:
+        _update_hashers_in_parallel(hashers, chunks)
+        return
+
+    for chunk in chunks:
+        for hasher in hashers:
+            hasher.update(chunk)
+
+
+def _update_hashers_in_parallel(hashers: List[Hasher], chunks) -> None:
+    """
+    updates each hasher on its own thread with the same read-only chunks
+
+    the first hasher runs on the calling thread. all hashers have to be done with a chunk before the next one is
+    requested, since the buffer of a chunk is reused by the reader (or released for mapped files).
+    """
+    executor = _hasher_executor()
+    for chunk in chunks:
+        futures = [executor.submit(hasher.update, chunk) for hasher in hashers[1:]]
+        hashers[0].update(chunk)
+        for future in futures:
+            future.result()
+
+
+_shared_hasher_executor = None
+_shared_hasher_executor_lock = threading.Lock()
 
 
-def new_hasher_for_hash_type(hash_format: str) -> Hasher:
+def _hasher_executor() -> ThreadPoolExecutor:
+    """
+    returns the thread pool for hashing multiple formats in parallel, it is created once and shared by all files
+
+    the pool is limited to the number of CPUs, the files hashed by multiple jobs share its threads.
+    """
+    global _shared_hasher_executor
+    with _shared_hasher_executor_lock:
+        if _shared_hasher_executor is None:
+            _shared_hasher_executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1, thread_name_prefix="ascmhl-hasher"
+            )
+        return _shared_hasher_executor
+
+
+def _file_chunks_for_io_backend(io_backend: IOBackend, file, file_path: str, file_stat: os.stat_result, chunk_size):
+    """
+    returns a generator for the chunks of an opened file as read by the given io backend
+    """
+    # all backends except the buffered one need a regular file with a real file descriptor
+    if not stat.S_ISREG(file_stat.st_mode) or not isinstance(file, io.BufferedReader):
+        return _buffered_file_chunks(file, chunk_size)
+
+    if io_backend == IOBackend.mmap:
+        # files that fit into a single chunk are read with one call, mapping them costs more than it saves
+        if file_stat.st_size > chunk_size:
+            return _mapped_file_chunks(file, chunk_size)
+    elif io_backend == IOBackend.uncached:
+        return _uncached_file_chunks(file, chunk_size)
+    elif io_backend == IOBackend.direct:
+        return _direct_file_chunks(file, file_path, chunk_size)
+    return _buffered_file_chunks(file, chunk_size)
+
+
+def _mapped_file_chunks(file, chunk_size: int):
+    """
+    yields the content of an opened file as memoryview slices of the memory mapped file, without copying any data
+
+    falls back to buffered reads if the file cannot be mapped. a yielded chunk is only valid until the next one is
+    requested.
+    """
+    try:
+        mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, OverflowError):
+        yield from _buffered_file_chunks(file, chunk_size)
+        return
+
+    with mapped_file:
+        if hasattr(mapped_file, "madvise"):
+            mapped_file.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped_file)
+        try:
+            for offset in range(0, len(view), chunk_size):
+                chunk = view[offset : offset + chunk_size]
+                try:
+                    yield chunk
+                finally:
+                    # the mapping can only be closed once all slices are released
+                    chunk.release()
+        finally:
+            view.release()
+
+
+def _uncached_file_chunks(file, chunk_size: int):
+    """
+    yields the content of an opened file like _buffered_file_chunks, but advises the kernel to drop the pages of
+    already hashed chunks from the page cache
+
+    uses posix_fadvise where available (Linux) and F_NOCACHE on macOS, otherwise it behaves like buffered reads.
+    """
+    file_descriptor = file.fileno()
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    elif fcntl is not None and hasattr(fcntl, "F_NOCACHE"):
+        fcntl.fcntl(file_descriptor, fcntl.F_NOCACHE, 1)
+
+    offset = 0
+    try:
+        for chunk in _buffered_file_chunks(file, chunk_size):
+            num_bytes = len(chunk)
+            yield chunk
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(file_descriptor, offset, num_bytes, os.POSIX_FADV_DONTNEED)
+            offset += num_bytes
+    finally:
+        # also drop the pages the kernel has read ahead and pages that were still busy when the chunk was dropped
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _direct_file_chunks(file, file_path: str, chunk_size: int):
+    """
+    yields the content of a file read with O_DIRECT into page aligned buffers, bypassing the page cache entirely
+
+    falls back to _uncached_file_chunks on platforms and file systems that don't support O_DIRECT (e.g. tmpfs).
+    """
+    # O_DIRECT needs buffers, sizes and offsets aligned to the block size of the device, buffers allocated with
+    # mmap are page aligned and the page size is a multiple of the usual block sizes
+    chunk_size = -(-chunk_size // mmap.PAGESIZE) * mmap.PAGESIZE
+    try:
+        file_descriptor = os.open(file_path, os.O_RDONLY | os.O_DIRECT)
+    except (AttributeError, OSError):
+        yield from _uncached_file_chunks(file, chunk_size)
+        return
+
+    # the anonymous mappings are closed once the file is read, instead of waiting for the garbage collector
+    buffers = []
+
+    def new_buffer():
+        buffer = mmap.mmap(-1, chunk_size)
+        buffers.append(buffer)
+        return buffer
+
+    try:
+        buffer = new_buffer()
+        try:
+            num_bytes = os.readv(file_descriptor, [buffer])
+        except OSError:
+            yield from _uncached_file_chunks(file, chunk_size)
+            return
+
+        if num_bytes == chunk_size:
+            yield from _read_ahead_chunks(lambda target: os.readv(file_descriptor, [target]), buffer, new_buffer)
+            return
+
+        while num_bytes:
+            chunk = memoryview(buffer)[:num_bytes]
+            try:
+                yield chunk
+            finally:
+                # the buffer can only be closed once all slices are released
+                chunk.release()
+            num_bytes = os.readv(file_descriptor, [buffer])
+    finally:
+        for buffer in buffers:
+            buffer.close()
+        os.close(file_descriptor)
+
+
+def _buffered_file_chunks(file, chunk_size: int):
+    """
+    yields the content of an opened file as memoryviews of consecutive chunks
+
+    files larger than one chunk are read ahead by a background thread, so reading the next chunk from disk overlaps
+    with hashing the current one. a yielded chunk is only valid until the next one is requested.
+    """
+    buffer = bytearray(chunk_size)
+    num_bytes = file.readinto(buffer)
+    if num_bytes == chunk_size:
+        yield from _read_ahead_chunks(file.readinto, buffer, lambda: bytearray(chunk_size))
+        return
+
+    # small files (or short reads) are not worth starting a reader thread
+    while num_bytes:
+        yield memoryview(buffer)[:num_bytes]
+        num_bytes = file.readinto(buffer)
+
+
+def _read_ahead_chunks(read_into, first_buffer, new_buffer):
+    """
+    yields the already read first buffer and the remaining content of a file in chunks of the same size
+    that are read by a background reader thread
+
+    the reader thread reads into two preallocated buffers (via read_into, e.g. readinto) in turns, while the caller
+    consumes the chunk in the other buffer. the hash libraries release the GIL on large buffers, so reading and
+    hashing actually run at the same time.
+
+    arguments:
+    read_into -- function reading the next bytes of the file into the given buffer, returns the number of bytes read
+    first_buffer -- the buffer containing the first chunk of the file
+    new_buffer -- function returning a new buffer of the same size as the first buffer
+    """
+    free_buffers = queue.Queue()
+    free_buffers.put(new_buffer())
+    filled_buffers = queue.Queue()
+
+    def read_chunks():
+        try:
+            while True:
+                buffer = free_buffers.get()
+                # the consumer has stopped early, don't read any further
+                if buffer is None:
+                    return
+                num_bytes = read_into(buffer)
+                filled_buffers.put((buffer, num_bytes, None))
+                if not num_bytes:
+                    return
+        except Exception as exception:
+            filled_buffers.put((None, 0, exception))
+
+    reader = threading.Thread(target=read_chunks, name="ascmhl-reader", daemon=True)
+    reader.start()
+    try:
+        chunk = memoryview(first_buffer)
+        try:
+            yield chunk
+        finally:
+            # release the chunks, so the caller can close buffers like mappings once the file is read
+            chunk.release()
+        free_buffers.put(first_buffer)
+        while True:
+            buffer, num_bytes, exception = filled_buffers.get()
+            if exception is not None:
+                raise exception
+            if not num_bytes:
+                return
+            chunk = memoryview(buffer)[:num_bytes]
+            try:
+                yield chunk
+            finally:
+                chunk.release()
+            free_buffers.put(buffer)
+    finally:
+        free_buffers.put(None)
+        reader.join()
+
+
+def new_hasher_for_hash_type(hash_format: str, backend_name: str = None) -> Hasher:
     """
     creates a new instance of the appropriate Hasher class based on the hash_format argument
 
     arguments:
     hash_format -- string value, one of the supported hash formats, e.g. 'md5', 'xxh64'
+    backend_name -- string value, name of a registered hash backend, defaults to the selected backend of the format
     """
     if not hash_format:
         raise ValueError
@@ -375,7 +974,7 @@ def new_hasher_for_hash_type(hash_format: str) -> Hasher:
     if not hash_type:
         raise ValueError
 
-    return hash_type.value()  # instantiate and return a new Hasher of the specified HashType
+    return hash_type.value(backend_name)  # instantiate and return a new Hasher of the specified HashType
 
 
 def hash_of_hash_list(hash_list: [str], hash_format: str) -> str:
@@ -390,27 +989,54 @@ def hash_of_hash_list(hash_list: [str], hash_format: str) -> str:
     return hasher.hash_of_hash_list(hash_list)
 
 
-def multiple_format_hash_file(file_path: str, hash_formats: [str]) -> Dict[str, str]:
+def multiple_format_hash_file(
+    file_path: str, hash_formats: [str], chunk_size: int = None, io_backend: IOBackend = None
+) -> Dict[str, str]:
     """
     computes and returns a new hash strings for a file
 
     arguments:
     file_path -- string value, path of file to generate hash for.
     hash_formats -- string values, each entry is one of the supported hash formats, e.g. 'md5', 'xxh64'
+    chunk_size -- size of the chunks the file is read in, defaults to default_chunk_size
+    io_backend -- IOBackend used for reading the file, defaults to default_io_backend
+    """
+    return AggregateHasher.hash_file(file_path, hash_formats, chunk_size, io_backend)
+
+
+def multiple_format_hash_file_digests(
+    file_path: str, hash_formats: [str], chunk_size: int = None, io_backend: IOBackend = None
+) -> Dict[str, HashDigest]:
+    """
+    computes and returns new (not yet encoded) digests for a file, arguments are the same as for
+    multiple_format_hash_file
     """
-    return AggregateHasher.hash_file(file_path, hash_formats)
+    return AggregateHasher.hash_file_digests(file_path, hash_formats, chunk_size, io_backend)
+
+
+def hash_file_digest(
+    filepath: str, hash_format: str, chunk_size: int = None, io_backend: IOBackend = None
+) -> HashDigest:
+    """
+    computes and returns a new (not yet encoded) digest for a file, arguments are the same as for hash_file
+    """
+    hasher = new_hasher_for_hash_type(hash_format)
+    update_hashers_from_file([hasher], filepath, chunk_size, io_backend)
+    return hasher.digest()
 
 
-def hash_file(filepath: str, hash_format: str) -> str:
+def hash_file(filepath: str, hash_format: str, chunk_size: int = None, io_backend: IOBackend = None) -> str:
     """
     computes and returns a new hash string for a file
 
     arguments:
     filepath -- string value, path of file to generate hash for.
     hash_format -- string value, one of the supported hash formats, e.g. 'md5', 'xxh64'
+    chunk_size -- size of the chunks the file is read in, defaults to default_chunk_size
+    io_backend -- IOBackend used for reading the file, defaults to default_io_backend
     """
     hasher = new_hasher_for_hash_type(hash_format)
-    return hasher.hash_file(filepath)
+    return hasher.hash_file(filepath, chunk_size, io_backend)
 
 
 def hash_data(input_data: bytes, hash_format: str) -> str:
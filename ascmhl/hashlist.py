@@ -8,14 +8,18 @@ __email__ = "opensource@pomfort.com"
 """
 
 from __future__ import annotations
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional, Set, Union
 from datetime import datetime
 import os
+import threading
 
 from . import logger
 from .ignore import MHLIgnoreSpec
 from .__version__ import ascmhl_reference_hash_format
-from .hasher import hash_file
+from .hasher import hash_file, HashDigest
+
+# the hashes of lazily parsed hash lists might be accessed from multiple worker threads
+_load_hashes_lock = threading.RLock()
 
 
 class MHLHashList:
@@ -39,32 +43,88 @@ class MHLHashList:
 
     other member variables:
     file path -- file path of the represented MHL file
+    pending_hashes_file_path -- file path of a lazily parsed MHL file whose hashes and references are parsed on the
+                                first access (None if they have been parsed already)
+    pending_hashes_parser_state -- the parser and file position to resume the parsing of a lazily parsed MHL file at
+                                   the hashes element (None if the hashes have been parsed already)
+    reference_hash -- the cached c4 hash of the MHL file (see generate_reference_hash), None if not known yet
     """
 
     creator_info: Optional[MHLCreatorInfo]
     process_info: MHLProcessInfo
-    media_hashes: List[MHLMediaHash]
-    media_hashes_path_map: Dict[str, MHLMediaHash]
     # referenced_hash_lists are the loaded hash list object
     referenced_hash_lists = List["MHLHashList"]
-    # while hash_list_references store the reference objects found in the mhl files
-    hash_list_references = List["MHLHashListReference"]
     file_path: Optional[str]
     generation_number: Optional[int]
+    pending_hashes_file_path: Optional[str]
+    pending_hashes_parser_state: Optional[tuple]
+    reference_hash: Optional[str]
 
     def __init__(self):
         self.creator_info = None
         self.process_info = MHLProcessInfo()
-        self.media_hashes = []
         self.file_path = None
         self.generation_number = None
         self.referenced_hash_lists = []
-        self.hash_list_references = []
-        self.media_hashes_path_map = {}
+        self.pending_hashes_file_path = None
+        self.pending_hashes_parser_state = None
+        self.reference_hash = None
+        self._media_hashes = []
+        self._media_hashes_path_map = {}
+        self._hash_list_references = []
+
+    # lazily parsed hashes and references
+
+    @property
+    def media_hashes(self) -> List[MHLMediaHash]:
+        if self.pending_hashes_file_path is not None:
+            self.load_hashes()
+        return self._media_hashes
+
+    @media_hashes.setter
+    def media_hashes(self, media_hashes: List[MHLMediaHash]):
+        self._media_hashes = media_hashes
+
+    @property
+    def media_hashes_path_map(self) -> Dict[str, MHLMediaHash]:
+        if self.pending_hashes_file_path is not None:
+            self.load_hashes()
+        return self._media_hashes_path_map
+
+    @property
+    def hash_list_references(self) -> List[MHLHashListReference]:
+        # the reference objects found in the mhl file, while referenced_hash_lists are the loaded hash list objects
+        if self.pending_hashes_file_path is not None:
+            self.load_hashes()
+        return self._hash_list_references
+
+    def load_hashes(self):
+        """parses the hashes and references of a lazily parsed MHL file, does nothing if they are parsed already"""
+        with _load_hashes_lock:
+            if self.pending_hashes_file_path is None:
+                return
+            # imported here, the parser module depends on this module
+            from . import hashlist_xml_parser
+
+            logger.debug(f"loading hashes of {self.pending_hashes_file_path}")
+            # resume the parsing at the hashes element, the header has been parsed already
+            parsed_hash_list = hashlist_xml_parser.parse_hashes(
+                self.pending_hashes_file_path, self.pending_hashes_parser_state
+            )
+            # keep the hashes of the already parsed header, e.g. the root hash that might be referenced already
+            media_hashes_path_map = dict(self._media_hashes_path_map)
+            media_hashes_path_map.update(parsed_hash_list._media_hashes_path_map)
+            self._media_hashes = self._media_hashes + parsed_hash_list._media_hashes
+            self._media_hashes_path_map = media_hashes_path_map
+            self._hash_list_references = self._hash_list_references + parsed_hash_list._hash_list_references
+            self.pending_hashes_parser_state = None
+            self.pending_hashes_file_path = None
 
     # methods to query for hashes
     def find_media_hash_for_path(self, relative_path):
-        return self.media_hashes_path_map.get(relative_path)
+        if self.pending_hashes_file_path is not None:
+            self.load_hashes()
+        return self._media_hashes_path_map.get(relative_path)
 
     def find_or_create_media_hash_for_path(self, relative_path, file_size, file_modification_date):
         media_hash = self.find_media_hash_for_path(relative_path)
@@ -97,19 +157,26 @@ class MHLHashList:
         return os.path.dirname(os.path.dirname(self.file_path))
 
     def generate_reference_hash(self):
-        return hash_file(self.file_path, ascmhl_reference_hash_format)
+        """returns the hash for referencing the MHL file, computed only once since written MHL files don't change"""
+        if self.reference_hash is None:
+            self.reference_hash = hash_file(self.file_path, ascmhl_reference_hash_format)
+        return self.reference_hash
 
     # build
     def append_hash(self, media_hash: MHLMediaHash):
+        if self.pending_hashes_file_path is not None:
+            self.load_hashes()
         if media_hash.path == ".":
             self.process_info.root_media_hash = media_hash
         else:
-            self.media_hashes.append(media_hash)
-        self.media_hashes_path_map[media_hash.previous_path or media_hash.path] = media_hash
-        self.media_hashes_path_map[media_hash.path] = media_hash
+            self._media_hashes.append(media_hash)
+        self._media_hashes_path_map[media_hash.previous_path or media_hash.path] = media_hash
+        self._media_hashes_path_map[media_hash.path] = media_hash
 
     def append_hash_list_reference(self, reference: MHLHashListReference):
-        self.hash_list_references.append(reference)
+        if self.pending_hashes_file_path is not None:
+            self.load_hashes()
+        self._hash_list_references.append(reference)
 
     # log
     def log(self):
@@ -215,23 +282,26 @@ class MHLHashEntry:
     managed by a MHLMediaHash object
 
     attribute member variables:
-    hash_string -- string representation (hex) of the hash value
+    digest -- HashDigest of the hash value, hash_string is its string representation (e.g. hex)
+    structure_digest -- HashDigest of the structure hash value of directories, structure_hash_string is its string
     hash_format -- string value, hash format, e.g. 'md5', 'xxh64'
     action -- action/result of verification, e.g. 'verified', 'failed', 'original'
 
     other member variables:
     """
 
-    hash_string: str
-    structure_hash_string: str
+    digest: Optional[HashDigest]
+    structure_digest: Optional[HashDigest]
     hash_format: str
     hash_date: datetime
     action: Optional[str]
 
-    def __init__(self, hash_format: str, hash_string: str, action: str = None, hash_date: datetime = None):
+    def __init__(
+        self, hash_format: str, hash_string: Union[str, HashDigest], action: str = None, hash_date: datetime = None
+    ):
         self.hash_format = hash_format
-        self.hash_string = hash_string
-        self.structure_hash_string = None
+        self.digest = HashDigest.from_value(hash_format, hash_string)
+        self.structure_digest = None
 
         self.action = action
         if hash_date != None:
@@ -239,6 +309,22 @@ class MHLHashEntry:
         else:
             self.hash_date = datetime.now()
 
+    @property
+    def hash_string(self) -> Optional[str]:
+        return self.digest.hash_string if self.digest is not None else None
+
+    @hash_string.setter
+    def hash_string(self, hash_string: Union[str, HashDigest]):
+        self.digest = HashDigest.from_value(self.hash_format, hash_string)
+
+    @property
+    def structure_hash_string(self) -> Optional[str]:
+        return self.structure_digest.hash_string if self.structure_digest is not None else None
+
+    @structure_hash_string.setter
+    def structure_hash_string(self, structure_hash_string: Union[str, HashDigest]):
+        self.structure_digest = HashDigest.from_value(self.hash_format, structure_hash_string)
+
 
 class MHLHashListReference:
     """
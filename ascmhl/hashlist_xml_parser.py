@@ -31,30 +31,92 @@ from .hashlist import (
 from .ignore import MHLIgnoreSpec
 from .utils import datetime_isostring
 
+# size of the chunks that are read from the MHL files and fed to the parser
+parse_chunk_size = 64 * 1024
 
-def parse(file_path):
-    """parsing the MHL XML file and building the MHLHashList for the hash_list member variable"""
+
+def parse(file_path, lazy: bool = False):
+    """
+    parsing the MHL XML file and building the MHLHashList for the hash_list member variable
+
+    with lazy the parsing stops at the hashes element, the creator info, process info and root hash are available
+    right away. the parsing is resumed at the hashes element when the hashes or references are accessed first
+    (see MHLHashList.load_hashes and parse_hashes).
+    """
     logger.debug(f"parsing {file_path}...")
 
     start = timer()
 
     hash_list = MHLHashList()
     hash_list.file_path = file_path
+
+    # use a pull parser to prevent large memory usage when parsing large files, it also keeps the state for resuming
+    # lazily parsed files. read the file handle instead of passing the path to support the fake filesystem of the tests
+    parser = etree.XMLPullParser(events=("start", "end"))
+    existing_ignore_patterns = []
+    with open(file_path, "rb") as file:
+        if not _parse_events(hash_list, _parser_events(parser, file), existing_ignore_patterns, lazy):
+            # everything up to the current position has been fed to the parser already
+            hash_list.pending_hashes_file_path = file_path
+            hash_list.pending_hashes_parser_state = (parser, file.tell())
+
+    hash_list.process_info.ignore_spec = MHLIgnoreSpec(existing_ignore_patterns)
+    logger.debug(f"parsing took: {timer() - start}")
+
+    return hash_list
+
+
+def parse_hashes(file_path, parser_state) -> MHLHashList:
+    """
+    resumes the parsing of a lazily parsed MHL file at the hashes element
+
+    returns a new MHLHashList with the hashes and references of the MHL file, the header isn't parsed again
+    """
+    logger.debug(f"parsing hashes of {file_path}...")
+
+    start = timer()
+
+    hash_list = MHLHashList()
+    hash_list.file_path = file_path
+    parser, position = parser_state
+    with open(file_path, "rb") as file:
+        file.seek(position)
+        _parse_events(hash_list, _parser_events(parser, file), [], False)
+    logger.debug(f"parsing took: {timer() - start}")
+
+    return hash_list
+
+
+def _parser_events(parser: etree.XMLPullParser, file):
+    """feeds the file to the parser in chunks and yields the parse events, including the pending events"""
+    while True:
+        yield from parser.read_events()
+        data = file.read(parse_chunk_size)
+        if not data:
+            break
+        parser.feed(data)
+    parser.close()
+    yield from parser.read_events()
+
+
+def _parse_events(hash_list: MHLHashList, events, existing_ignore_patterns: List[str], stop_at_hashes: bool) -> bool:
+    """
+    builds the hash list from the parse events, returns False if the parsing stopped at the hashes element
+    """
     object_stack = []
     current_object = None
     is_directory_structure = False
 
-    # use iterparse to prevent large memory usage when parsing large files
-    # pass a file handle to iterparse instead of the path directly to support the fake filesystem used in the tests
-    file = open(file_path, "rb")
-    existing_ignore_patterns = []
-    for event, element in etree.iterparse(file, events=("start", "end")):
+    for event, element in events:
         # check if we need to create a new container
         if event == "start":
             # the tag might contain the namespace like {urn:ASC:MHL:v2.0}hash, so we need to strip the namespace part
             # doing it with split is faster than using the lxml QName method
             tag = element.tag.split("}", 1)[-1]
 
+            if stop_at_hashes and tag == "hashes":
+                return False
+
             if not current_object:
                 if tag == "creatorinfo":
                     current_object = MHLCreatorInfo()
@@ -190,10 +252,7 @@ def parse(file_path):
                 while element.getprevious() is not None:
                     del element.getparent()[0]
 
-    hash_list.process_info.ignore_spec = MHLIgnoreSpec(existing_ignore_patterns)
-    logger.debug(f"parsing took: {timer() - start}")
-
-    return hash_list
+    return True
 
 
 def write_hash_list(hash_list: MHLHashList, file_path: str):
@@ -207,6 +266,8 @@ def write_hash_list(hash_list: MHLHashList, file_path: str):
     if not os.path.isdir(directory_path):
         os.mkdir(directory_path)
 
+    # the written file has a different hash than a file the hash list might have been read from
+    hash_list.reference_hash = None
     file = open(file_path, "wb")
     file.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<hashlist version="2.0" xmlns="urn:ASC:MHL:v2.0">\n')
     current_indent = "  "
@@ -8,18 +8,28 @@ __email__ = "opensource@pomfort.com"
 """
 
 from __future__ import annotations
+import bisect
 import os
 import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, date, time
 
 from . import hasher
-from .__version__ import ascmhl_folder_name, ascmhl_file_extension, ascmhl_chainfile_name, ascmhl_collectionfile_name
+from .__version__ import (
+    ascmhl_folder_name,
+    ascmhl_file_extension,
+    ascmhl_chainfile_name,
+    ascmhl_collectionfile_name,
+    ascmhl_reference_hash_format,
+)
 from . import hashlist_xml_parser, chain_xml_parser
 from .utils import datetime_now_filename_string
-from typing import Tuple, List, Dict, Optional, Set
+from typing import Callable, Tuple, List, Dict, Optional, Set
 from . import logger, errors
 from .chain import MHLChain
-from .hashlist import MHLHashList, MHLHashEntry
+from .hashlist import MHLHashList, MHLHashEntry, MHLMediaHash
+from .history_cache import MHLHistoryCache
 
 
 class MHLHistory:
@@ -40,6 +50,14 @@ class MHLHistory:
     parent_history -- the one parent history if any
     child_history_mappings -- mapping of all (also transitive) child histories and their relative
                               path to find the appropriate child
+    media_hash_path_index -- mapping of the relative paths in all hash lists to the indices of the hash lists
+                             containing the path and the media hashes (without the child histories)
+    renamed_path_index -- mapping of previous paths of renamed files to their latest path
+    hash_entry_index -- mapping of the relative paths (and previous paths) in all hash lists to the
+                        precomputed hash entries used by the find_*_for_path methods
+
+    the indices are built on the first query after hash lists have been appended, so histories that are only loaded
+    to access the headers of the generations don't parse the hashes of lazily loaded hash lists (see load_from_path)
 
     attribute member variables:
 
@@ -55,6 +73,9 @@ class MHLHistory:
     child_histories: List[MHLHistory]
     child_history_mappings: Dict[str, MHLHistory]
     parent_history: Optional[MHLHistory]
+    media_hash_path_index: Dict[str, List[Tuple[int, MHLMediaHash]]]
+    renamed_path_index: Dict[str, str]
+    hash_entry_index: Dict[str, MHLPathHashEntries]
 
     def __init__(self):
         self.chain = None
@@ -63,10 +84,56 @@ class MHLHistory:
         self.child_history_mappings = {}
         self.parent_history = None
         self.asc_mhl_path = None
+        self.media_hash_path_index = {}
+        self.renamed_path_index = {}
+        self.hash_entry_index = {}
+        self._child_history_trie = None
+        self._directory_history_cache = {}
+        self._root_prefix = None
+        self._root_prefix_asc_mhl_path = None
+        # the hash lists are indexed in the order of generations, the first ones might be indexed already
+        self._num_indexed_hash_lists = 0
+        self._index_lock = threading.Lock()
+        # reentrant, load_child_history updates the child history mappings while holding the lock
+        self._child_history_lock = threading.RLock()
 
     def append_hash_list(self, hash_list):
         self.hash_lists.append(hash_list)
 
+    def _index_hash_lists(self, is_complete: Optional[Callable[[], bool]] = None):
+        """adds the appended hash lists to the path indices, so path lookups don't have to scan all generations
+
+        the hash lists are indexed generation by generation and only until is_complete returns True, so queries
+        that are answered by the first generations don't load the hashes of lazily parsed later generations.
+        """
+        if self._num_indexed_hash_lists == len(self.hash_lists):
+            return
+        # the queries might be called from multiple worker threads
+        with self._index_lock:
+            while self._num_indexed_hash_lists < len(self.hash_lists):
+                if is_complete is not None and is_complete():
+                    return
+                hash_list_index = self._num_indexed_hash_lists
+                self._index_hash_list(hash_list_index, self.hash_lists[hash_list_index])
+                # only counted after indexing, other threads must not query the partially built indices
+                self._num_indexed_hash_lists = hash_list_index + 1
+
+    def _index_hash_list(self, hash_list_index: int, hash_list: MHLHashList):
+        for media_hash in hash_list.media_hashes:
+            indexed_media_hashes = self.media_hash_path_index.setdefault(media_hash.path, [])
+            # only the first media hash of a path per hash list is used, like with scanning the media hashes
+            if not indexed_media_hashes or indexed_media_hashes[-1][0] != hash_list_index:
+                indexed_media_hashes.append((hash_list_index, media_hash))
+            if media_hash.previous_path is not None:
+                self.renamed_path_index[media_hash.previous_path] = media_hash.path
+        # the hash entries are looked up like with find_media_hash_for_path of the hash list (also by previous path)
+        for relative_path, media_hash in hash_list.media_hashes_path_map.items():
+            path_hash_entries = self.hash_entry_index.get(relative_path)
+            if path_hash_entries is None:
+                path_hash_entries = MHLPathHashEntries()
+                self.hash_entry_index[relative_path] = path_hash_entries
+            path_hash_entries.append_media_hash(media_hash, hash_list.generation_number)
+
     def get_root_path(self):
         if not self.asc_mhl_path:
             return None
@@ -76,9 +143,23 @@ class MHLHistory:
         if not self.asc_mhl_path:
             return None
         if os.path.isabs(file_path):
+            # fast path for normalized paths inside the history, avoids the normalization of both paths in relpath
+            root_prefix = self._absolute_root_prefix()
+            if root_prefix is not None and file_path.startswith(root_prefix):
+                relative_path = file_path[len(root_prefix) :]
+                if _is_normalized_relative_path(relative_path):
+                    return relative_path
             return os.path.relpath(file_path, os.path.dirname(self.asc_mhl_path))
         return None
 
+    def _absolute_root_prefix(self) -> Optional[str]:
+        """the (cached) normalized absolute root path with a trailing separator, None for relative root paths"""
+        if self._root_prefix_asc_mhl_path != self.asc_mhl_path:
+            root_path = os.path.dirname(self.asc_mhl_path)
+            self._root_prefix = os.path.join(os.path.normpath(root_path), "") if os.path.isabs(root_path) else None
+            self._root_prefix_asc_mhl_path = self.asc_mhl_path
+        return self._root_prefix
+
     def latest_generation_number(self) -> int:
         latest_number = 0
         for hash_list in self.hash_lists:
@@ -99,20 +180,47 @@ class MHLHistory:
         return hash_list.process_info.ignore_spec.get_pattern_list()
 
     # methods to query and compare hashes
+    def find_media_hashes_for_path(self, relative_path: str) -> List[MHLMediaHash]:
+        """returns the media hashes of a path in all generations that contain the path, in the order of generations"""
+        self._index_hash_lists()
+        return [media_hash for _, media_hash in self.media_hash_path_index.get(relative_path, [])]
+
+    def number_of_generations_with_path(self, relative_path: str) -> int:
+        """returns the number of generations that contain the path"""
+        self._index_hash_lists()
+        return len(self.media_hash_path_index.get(relative_path, []))
+
+    def find_original_path_for_path(self, relative_path: str) -> str:
+        """follows the previous paths of renamed files through the generations to the path a file was recorded with
+
+        starts with the first generation, every generation that contains the (previous) path and records a
+        previous path for it continues the search with the previous path in the following generations.
+        """
+        self._index_hash_lists()
+        hash_list_index = 0
+        while True:
+            indexed_media_hashes = self.media_hash_path_index.get(relative_path, [])
+            position = bisect.bisect_left(indexed_media_hashes, hash_list_index, key=lambda item: item[0])
+            if position == len(indexed_media_hashes):
+                return relative_path
+            hash_list_index, media_hash = indexed_media_hashes[position]
+            relative_path = media_hash.previous_path or relative_path
+            hash_list_index += 1
+
     def find_original_hash_entry_for_path(self, relative_path: str) -> Optional[MHLHashEntry]:
         """Searches the history for the first (original) hash of a file
 
         starts with the first generation, if we don't find it there we continue to look in all other generations
         until we've found the first appearance of the give file.
         """
-        for hash_list in self.hash_lists:
-            media_hash = hash_list.find_media_hash_for_path(relative_path)
-            if media_hash is None:
-                continue
-            for hash_entry in media_hash.hash_entries:
-                if hash_entry.action == "original":
-                    return hash_entry
-        return None
+
+        def original_hash_entry() -> Optional[MHLHashEntry]:
+            path_hash_entries = self.hash_entry_index.get(relative_path)
+            return path_hash_entries.original_hash_entry if path_hash_entries is not None else None
+
+        # the original hash entry doesn't change anymore once it has been found in a generation
+        self._index_hash_lists(lambda: original_hash_entry() is not None)
+        return original_hash_entry()
 
     # methods to query and compare hashes
     def find_directory_hash_entries_for_path(self, relative_path: str) -> List[MHLHashEntry]:
@@ -121,16 +229,11 @@ class MHLHistory:
         starts with the first generation through all other generations
         and collects all directory hashes found for the given folder.
         """
+        self._index_hash_lists()
         directory_hash_entries = []
-        for hash_list in self.hash_lists:
-            media_hash = hash_list.find_media_hash_for_path(relative_path)
-            if media_hash is None:
-                continue
-            if media_hash.is_directory:
-                for hash_entry in media_hash.hash_entries:
-                    # FIXME is there a better way of accessing the generation from a hash entry?
-                    hash_entry.temp_generation_number = hash_list.generation_number
-                directory_hash_entries = directory_hash_entries + media_hash.hash_entries
+        path_hash_entries = self.hash_entry_index.get(relative_path)
+        if path_hash_entries is not None:
+            directory_hash_entries = list(path_hash_entries.directory_hash_entries)
 
         # also search the root directory hashes from all child histories
         if relative_path == ".":
@@ -150,43 +253,71 @@ class MHLHistory:
         starts with the first generation, if we don't find it there we continue to look in all other generations
         until we've found the first appearance of the give file.
         """
-        for hash_list in self.hash_lists:
-            media_hash = hash_list.find_media_hash_for_path(relative_path)
-            if media_hash is None:
-                continue
-            for hash_entry in media_hash.hash_entries:
-                if hash_format is not None and hash_entry.hash_format == hash_format:
-                    return hash_entry
-                elif hash_format is None:
-                    return hash_entry
-        return None
+
+        def first_hash_entry() -> Optional[MHLHashEntry]:
+            path_hash_entries = self.hash_entry_index.get(relative_path)
+            if path_hash_entries is None:
+                return None
+            if hash_format is None:
+                return path_hash_entries.first_hash_entry
+            return path_hash_entries.first_hash_entries_by_format.get(hash_format)
+
+        # the first hash entries don't change anymore once they have been found in a generation
+        self._index_hash_lists(lambda: first_hash_entry() is not None)
+        return first_hash_entry()
 
     def find_existing_hash_formats_for_path(self, relative_path: str) -> List[str]:
         """Searches through the history to find all existing hash formats we might want to compare against"""
-        hash_formats = []
-        for hash_list in self.hash_lists:
-            media_hash = hash_list.find_media_hash_for_path(relative_path)
-            if media_hash is None:
-                continue
-            for hash_entry in media_hash.hash_entries:
-                if hash_entry.hash_format not in hash_formats:
-                    hash_formats.append(hash_entry.hash_format)
-        return hash_formats
+        self._index_hash_lists()
+        path_hash_entries = self.hash_entry_index.get(relative_path)
+        if path_hash_entries is None:
+            return []
+        return list(path_hash_entries.first_hash_entries_by_format)
 
     # def handling of child histories
     def find_history_for_path(self, relative_path: str) -> Tuple[MHLHistory, str]:
-        if len(self.child_histories) == 0:
+        # the mappings are replaced together with the directory cache, see _update_child_history_mapping
+        if not self.child_history_mappings:
             return self, relative_path
-        dir_path = relative_path
-        # shorten the path until we find a mapping otherwise there is no child history that should handle the path
-        while len(dir_path) > 0:
-            if dir_path in self.child_history_mappings:
-                history = self.child_history_mappings[dir_path]
-                absolute_path = os.path.join(self.get_root_path(), relative_path)
-                history_relative_path = history.get_relative_file_path(absolute_path)
-                return history, history_relative_path
-            dir_path = os.path.dirname(dir_path)
-        return self, relative_path
+        # the root folder of a child history is handled by the child history itself
+        history = self.child_history_mappings.get(relative_path)
+        if history is not None:
+            return history, "."
+        dir_path, _, name = relative_path.rpartition(os.sep)
+        history, history_relative_dir_path = self._find_history_for_directory(dir_path)
+        if history is self:
+            return self, relative_path
+        if history_relative_dir_path == "":
+            return history, name
+        return history, history_relative_dir_path + os.sep + name
+
+    def _find_history_for_directory(self, relative_dir_path: str) -> Tuple[MHLHistory, str]:
+        """returns the (cached) history that handles the files in a directory and the directory path in that history"""
+        result = self._directory_history_cache.get(relative_dir_path)
+        if result is not None:
+            return result
+        with self._child_history_lock:
+            if self._child_history_trie is None:
+                self._child_history_trie = _ChildHistoryTrieNode.from_mappings(self.child_history_mappings)
+            node = self._child_history_trie
+            directory_history_cache = self._directory_history_cache
+
+        # walk down the path components as far as possible, the deepest child history handles the directory
+        components = relative_dir_path.split(os.sep) if relative_dir_path else []
+        history, history_depth = self, 0
+        for depth, component in enumerate(components, 1):
+            node = node.children.get(component)
+            if node is None:
+                break
+            if node.history is not None:
+                history, history_depth = node.history, depth
+
+        if history is self:
+            result = self, relative_dir_path
+        else:
+            result = history, os.sep.join(components[history_depth:])
+        directory_history_cache[relative_dir_path] = result
+        return result
 
     def set_of_file_paths(self) -> Set[str]:
         all_paths = set()
@@ -198,9 +329,12 @@ class MHLHistory:
         return all_paths
 
     def renamed_path_with_previous_path(self):
-        all_paths = {}
-        for hash_list in self.hash_lists:
-            all_paths.update(hash_list.renamed_path_with_previous_path(self.get_root_path()))
+        self._index_hash_lists()
+        root_path = self.get_root_path()
+        all_paths = {
+            os.path.join(root_path, previous_path): os.path.join(root_path, path)
+            for previous_path, path in self.renamed_path_index.items()
+        }
         for child_history in self.child_histories:
             all_paths.update(child_history.renamed_path_with_previous_path())
         return all_paths
@@ -214,11 +348,98 @@ class MHLHistory:
     def append_child_history(self, child_history: MHLHistory) -> None:
         self.child_histories.append(child_history)
 
+    def load_child_history(self, root_path: str) -> Optional[MHLHistory]:
+        """
+        loads the history at a path inside this history (if not loaded yet) as child history of the enclosing history
+
+        used for child histories that are found while traversing the file system tree, if the history has been loaded
+        without find_child_histories. the child histories of the loaded history are loaded from its references, the
+        traversal adds the others when it reaches them. the history might be queried from other threads meanwhile.
+        returns the loaded history, None if the history has been loaded already.
+        """
+        relative_path = self.get_relative_file_path(root_path)
+        if relative_path == "." or relative_path in self.child_history_mappings:
+            return None
+        child_history = MHLHistory.load_from_path(root_path, find_child_histories=False)
+        # the child histories are only replaced while holding the lock, queries of other threads see them either
+        # before or after adding the loaded history
+        with self._child_history_lock:
+            self._add_loaded_child_history(child_history)
+        return child_history
+
+    def _add_loaded_child_history(self, child_history: MHLHistory) -> None:
+        root_path = child_history.get_root_path()
+        parent_history, _ = self.find_history_for_path(self.get_relative_file_path(root_path))
+
+        # histories inside the loaded history might have been loaded from older references of the enclosing history
+        child_root_prefix = os.path.join(root_path, "")
+        inner_histories = [h for h in parent_history.child_histories if h.get_root_path().startswith(child_root_prefix)]
+        for inner_history in inner_histories:
+            inner_relative_path = child_history.get_relative_file_path(inner_history.get_root_path())
+            if inner_relative_path not in child_history.child_history_mappings:
+                inner_history.parent_history = child_history
+                child_history.child_histories.append(inner_history)
+        # keep the child histories in traversal order, they are also committed in this order
+        child_history.child_histories.sort(key=_root_path_components)
+        child_history._update_child_history_mapping()
+
+        child_history.parent_history = parent_history
+        # replace the list instead of modifying it, other threads might iterate over the child histories
+        parent_history.child_histories = sorted(
+            [h for h in parent_history.child_histories if h not in inner_histories] + [child_history],
+            key=_root_path_components,
+        )
+        parent_history._update_child_history_mapping()
+
     # loading history and child histories from path
 
     @classmethod
-    def load_from_path(cls, root_path):
-        """finds all MHL files in the asc-mhl folder, returns the mhl_history instance with all mhl_hashlists"""
+    def load_from_path(cls, root_path, lazy: bool = False, jobs: int = 1, find_child_histories: bool = True):
+        """
+        finds all MHL files in the asc-mhl folder, returns the mhl_history instance with all mhl_hashlists
+
+        with lazy only the headers of the MHL files (creator info, process info and root hash) are parsed, their
+        hashes and references are parsed when they are accessed first. the MHL files are still validated against the
+        chain file, the hash list references between the histories are not resolved though.
+
+        with more than one job the MHL files of the history and all child histories are validated against the chain
+        files and parsed on a thread pool, the history is assembled in the same order as with a single job.
+
+        with find_child_histories the whole file system tree is traversed to find the child histories. otherwise only
+        the child histories that are referenced in the MHL files are loaded, callers that traverse the file system
+        tree anyway add the other child histories while traversing (see load_child_history).
+        """
+        if jobs <= 1:
+            return cls._load_from_path(root_path, lazy, None, find_child_histories)
+
+        executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="ascmhl-loader")
+        try:
+            return cls._load_from_path(root_path, lazy, executor, find_child_histories)
+        finally:
+            # don't load the remaining MHL files if loading failed
+            executor.shutdown(cancel_futures=True)
+
+    @classmethod
+    def _load_from_path(
+        cls, root_path, lazy: bool, executor: Optional[ThreadPoolExecutor], find_child_histories: bool
+    ) -> MHLHistory:
+        root_loading = cls._start_loading(root_path, lazy, executor)
+        # the child histories are started level by level, so all histories of a level are loaded in parallel
+        loadings = [root_loading]
+        while loadings:
+            for loading in loadings:
+                history_root_path = loading.history.get_root_path()
+                if find_child_histories:
+                    child_history_paths = _find_child_history_paths(history_root_path)
+                else:
+                    child_history_paths = loading.referenced_child_history_paths()
+                loading.child_loadings = [cls._start_loading(path, lazy, executor) for path in child_history_paths]
+            loadings = [child_loading for loading in loadings for child_loading in loading.child_loadings]
+        return cls._finish_loading(root_loading, lazy)
+
+    @classmethod
+    def _start_loading(cls, root_path, lazy: bool, executor: Optional[ThreadPoolExecutor]) -> _HistoryLoading:
+        """parses the chain file of a history and starts loading its MHL files"""
 
         asc_mhl_folder_path = os.path.join(root_path, ascmhl_folder_name)
         history = cls()
@@ -228,17 +449,8 @@ class MHLHistory:
         if os.path.exists(asc_mhl_folder_path) and not os.path.exists(file_path):
             raise errors.NoMHLChainException(file_path)
         history.chain = chain_xml_parser.parse(file_path)
-        if history.chain.generations:
-            for generation in history.chain.generations:
-                expected_file = os.path.join(asc_mhl_folder_path, generation.ascmhl_filename)
-                if os.path.exists(expected_file):
-                    hash = hasher.hash_file(expected_file, generation.hash_format)
-                    if hash != generation.hash_string:
-                        raise errors.ModifiedMHLManifestFileException(expected_file)
-                else:
-                    raise errors.MissingMHLManifestException(expected_file)
 
-        hash_lists = []
+        hash_list_file_names = []
         for root, directories, filenames in os.walk(asc_mhl_folder_path):
             for filename in filenames:
                 if filename.endswith(ascmhl_file_extension):
@@ -246,23 +458,74 @@ class MHLHistory:
                     filename_no_extension, _ = os.path.splitext(filename)
                     parts = re.findall(MHLHistory.history_file_name_regex, filename_no_extension)
                     if len(parts) == 1 and len(parts[0]) == 2:
-                        file_path = os.path.join(asc_mhl_folder_path, filename)
-                        hash_list = hashlist_xml_parser.parse(file_path)
-                        generation_number = int(parts[0][0])
-                        hash_list.generation_number = generation_number
-                        # FIXME is there a better way of accessing the generation from a hash entry?
-                        if hash_list.process_info.root_media_hash is not None:
-                            for hash_entry in hash_list.process_info.root_media_hash.hash_entries:
-                                hash_entry.temp_generation_number = hash_list.generation_number
-                        hash_lists.append(hash_list)
+                        hash_list_file_names.append((filename, int(parts[0][0])))
                     else:
                         logger.error(f"name of ascmhl file {filename} does not conform to naming convention")
+
+        # unchanged manifests are loaded from the (optional) history cache without hashing and parsing them again
+        history_cache = MHLHistoryCache.from_environment()
+        generations = {}
+        for generation in history.chain.generations or []:
+            expected_file = os.path.join(asc_mhl_folder_path, generation.ascmhl_filename)
+            if not os.path.exists(expected_file):
+                raise errors.MissingMHLManifestException(expected_file)
+            generations[generation.ascmhl_filename] = generation
+
+        def submit(function, *args) -> Future:
+            if executor is not None:
+                return executor.submit(function, *args)
+            future = Future()
+            try:
+                future.set_result(function(*args))
+            except Exception as exception:
+                future.set_exception(exception)
+            return future
+
+        # every manifest is validated against its generation in the chain file before it is parsed
+        hash_list_futures = []
+        for filename, generation_number in hash_list_file_names:
+            file_path = os.path.join(asc_mhl_folder_path, filename)
+            generation = generations.pop(filename, None)
+            future = submit(_load_hash_list, file_path, generation, history_cache, lazy, True)
+            hash_list_futures.append((future, generation_number))
+        # manifests that don't conform to the naming convention are only validated
+        validation_futures = []
+        for filename, generation in generations.items():
+            file_path = os.path.join(asc_mhl_folder_path, filename)
+            validation_futures.append(submit(_load_hash_list, file_path, generation, history_cache, False, False))
+
+        return _HistoryLoading(history, validation_futures, hash_list_futures)
+
+    @classmethod
+    def _finish_loading(cls, loading: _HistoryLoading, lazy: bool) -> MHLHistory:
+        """waits for the MHL files of a history (and its child histories) and assembles the history"""
+        history = loading.history
+        for future in loading.validation_futures:
+            future.result()
+
+        hash_lists = []
+        for future, generation_number in loading.hash_list_futures:
+            hash_list = future.result()
+            hash_list.generation_number = generation_number
+            # FIXME is there a better way of accessing the generation from a hash entry?
+            if hash_list.process_info.root_media_hash is not None:
+                for hash_entry in hash_list.process_info.root_media_hash.hash_entries:
+                    hash_entry.temp_generation_number = hash_list.generation_number
+            hash_lists.append(hash_list)
         # sort all found hash lists by generation number first to make sure we add them to the history in order
         hash_lists.sort(key=lambda x: x.generation_number)
         for hash_list in hash_lists:
             history.append_hash_list(hash_list)
 
-        history._find_and_load_child_histories()
+        for child_loading in loading.child_loadings:
+            child_history = cls._finish_loading(child_loading, lazy)
+            child_history.parent_history = history
+            history.append_child_history(child_history)
+
+        # update parent children mapping with the found children
+        history._update_child_history_mapping()
+        if not lazy:
+            history._resolve_hash_list_references()
 
         return history
 
@@ -305,30 +568,19 @@ class MHLHistory:
 
         return history
 
-    def _find_and_load_child_histories(self) -> None:
-        """traverses the whole file system tree inside the history to find all sub histories"""
-        history_root = self.get_root_path()
-        for root, directories, _ in os.walk(history_root):
-            if root != history_root and ascmhl_folder_name in directories:
-                # we parse the mhl folder and clear the directories so we are not going deeper
-                # everything beneath is handled by the child history
-                child_history = MHLHistory.load_from_path(root)
-                child_history.parent_history = self
-                self.append_child_history(child_history)
-                directories.clear()
-
-        # update parent children mapping with the found children
-        self._update_child_history_mapping()
-        self._resolve_hash_list_references()
-
     def _update_child_history_mapping(self) -> None:
-        self.child_history_mappings = {}
+        child_history_mappings = {}
         for child_history in self.child_histories:
             relative_child_path = self.get_relative_file_path(child_history.get_root_path())
-            self.child_history_mappings[relative_child_path] = child_history
+            child_history_mappings[relative_child_path] = child_history
             for sub_child_relative_path, sub_child in child_history.child_history_mappings.items():
                 relative_path = os.path.join(relative_child_path, sub_child_relative_path)
-                self.child_history_mappings[relative_path] = sub_child
+                child_history_mappings[relative_path] = sub_child
+        # replace the mappings at once, child histories might be added while other threads query the history
+        with self._child_history_lock:
+            self.child_history_mappings = child_history_mappings
+            self._child_history_trie = None
+            self._directory_history_cache = {}
 
         if self.parent_history is not None:
             self.parent_history._update_child_history_mapping()
@@ -410,3 +662,167 @@ class MHLHistory:
         for hash_list in self.hash_lists:
             logger.info("")
             hash_list.log()
+
+
+class MHLPathHashEntries:
+    """
+    class for the precomputed hash entries of one path in all generations of a history, in the order of generations
+
+    model member variables:
+    original_hash_entry -- the first hash entry with the action "original"
+    first_hash_entry -- the first hash entry in any format
+    first_hash_entries_by_format -- the first hash entry per hash format, in the order the formats appear
+    directory_hash_entries -- the hash entries of all generations in which the path is a directory
+    """
+
+    __slots__ = ("original_hash_entry", "first_hash_entry", "first_hash_entries_by_format", "directory_hash_entries")
+
+    original_hash_entry: Optional[MHLHashEntry]
+    first_hash_entry: Optional[MHLHashEntry]
+    first_hash_entries_by_format: Dict[str, MHLHashEntry]
+    directory_hash_entries: List[MHLHashEntry]
+
+    def __init__(self):
+        self.original_hash_entry = None
+        self.first_hash_entry = None
+        self.first_hash_entries_by_format = {}
+        self.directory_hash_entries = []
+
+    def append_media_hash(self, media_hash: MHLMediaHash, generation_number: Optional[int]):
+        for hash_entry in media_hash.hash_entries:
+            if self.original_hash_entry is None and hash_entry.action == "original":
+                self.original_hash_entry = hash_entry
+            if self.first_hash_entry is None:
+                self.first_hash_entry = hash_entry
+            self.first_hash_entries_by_format.setdefault(hash_entry.hash_format, hash_entry)
+        if media_hash.is_directory:
+            for hash_entry in media_hash.hash_entries:
+                # FIXME is there a better way of accessing the generation from a hash entry?
+                hash_entry.temp_generation_number = generation_number
+            self.directory_hash_entries.extend(media_hash.hash_entries)
+
+
+def _is_normalized_relative_path(relative_path: str) -> bool:
+    """returns if a relative path is already normalized (as returned by relpath) and not "." itself"""
+    if os.altsep is not None and os.altsep in relative_path:
+        return False
+    for component in relative_path.split(os.sep):
+        if component in ("", ".", ".."):
+            return False
+    return True
+
+
+class _ChildHistoryTrieNode:
+    """a node of the trie of child histories by the components of their relative paths"""
+
+    __slots__ = ("children", "history")
+
+    children: Dict[str, _ChildHistoryTrieNode]
+    history: Optional[MHLHistory]
+
+    def __init__(self):
+        self.children = {}
+        self.history = None
+
+    @classmethod
+    def from_mappings(cls, child_history_mappings: Dict[str, MHLHistory]) -> _ChildHistoryTrieNode:
+        root = cls()
+        for relative_child_path, child_history in child_history_mappings.items():
+            node = root
+            for component in relative_child_path.split(os.sep):
+                node = node.children.setdefault(component, cls())
+            node.history = child_history
+        return root
+
+
+class _HistoryLoading:
+    """
+    the MHL files of a history that are loaded by load_from_path, and the loadings of its child histories
+
+    model member variables:
+    history -- the history the MHL files are loaded for
+    validation_futures -- futures of the MHL files that are only validated against the chain file
+    hash_list_futures -- (future, generation number) tuples of the MHL files that are validated and parsed
+    child_loadings -- loadings of the child histories
+    """
+
+    __slots__ = ("history", "validation_futures", "hash_list_futures", "child_loadings")
+
+    history: MHLHistory
+    validation_futures: List[Future]
+    hash_list_futures: List[Tuple[Future, int]]
+    child_loadings: List[_HistoryLoading]
+
+    def __init__(self, history: MHLHistory, validation_futures: List[Future], hash_list_futures):
+        self.history = history
+        self.validation_futures = validation_futures
+        self.hash_list_futures = hash_list_futures
+        self.child_loadings = []
+
+    def referenced_child_history_paths(self) -> List[str]:
+        """
+        returns the root paths of the existing child histories referenced in the MHL files of the history, so they
+        don't need to be searched in the file system tree
+        """
+        root_path = self.history.get_root_path()
+        relative_paths = set()
+        for future, _ in self.hash_list_futures:
+            for reference in future.result().hash_list_references:
+                relative_path = os.path.normpath(os.path.dirname(os.path.dirname(reference.path)))
+                if relative_path != "." and relative_path.split(os.sep, 1)[0] != os.pardir:
+                    relative_paths.add(relative_path)
+
+        child_history_paths = []
+        # child histories inside of other child histories are loaded by the enclosing child history
+        for relative_path in sorted(relative_paths, key=lambda path: path.split(os.sep)):
+            path = os.path.join(root_path, relative_path)
+            if any(path.startswith(os.path.join(child_path, "")) for child_path in child_history_paths):
+                continue
+            if os.path.isdir(os.path.join(path, ascmhl_folder_name)):
+                child_history_paths.append(path)
+        return child_history_paths
+
+
+def _root_path_components(history: MHLHistory) -> List[str]:
+    return history.get_root_path().split(os.sep)
+
+
+def _find_child_history_paths(root_path: str):
+    """traverses the whole file system tree inside a history to find the root paths of all direct sub histories"""
+    for root, directories, _ in os.walk(root_path):
+        if root != root_path and ascmhl_folder_name in directories:
+            # we clear the directories so we are not going deeper, everything beneath is handled by the child history
+            yield root
+            directories.clear()
+
+
+def _load_hash_list(
+    file_path: str, generation, history_cache: Optional[MHLHistoryCache], lazy: bool, parse: bool
+) -> Optional[MHLHashList]:
+    """validates an MHL file against its generation in the chain file (if any) and parses it if requested"""
+    cache_entry_key = None
+    if generation is not None:
+        if history_cache is not None:
+            cache_entry_key = MHLHistoryCache.entry_key(file_path, generation)
+            cached_hash_list = history_cache.load_hash_list(file_path, cache_entry_key)
+            if cached_hash_list is not None:
+                _set_reference_hash(cached_hash_list, generation)
+                return cached_hash_list
+        hash = hasher.hash_file(file_path, generation.hash_format)
+        if hash != generation.hash_string:
+            raise errors.ModifiedMHLManifestFileException(file_path)
+    if not parse:
+        return None
+    # hash lists that are stored in the cache are parsed completely
+    hash_list = hashlist_xml_parser.parse(file_path, lazy and cache_entry_key is None)
+    if cache_entry_key is not None:
+        history_cache.store_hash_list(file_path, cache_entry_key, hash_list)
+    if generation is not None:
+        _set_reference_hash(hash_list, generation)
+    return hash_list
+
+
+def _set_reference_hash(hash_list: MHLHashList, generation) -> None:
+    """reuses the validated hash of the chain file as reference hash, so the MHL file isn't hashed again"""
+    if generation.hash_format == ascmhl_reference_hash_format:
+        hash_list.reference_hash = generation.hash_string
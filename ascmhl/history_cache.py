@@ -0,0 +1,103 @@
+"""
+__author__ = "Patrick Renner, Alexander Sahm"
+__copyright__ = "Copyright 2024, Pomfort GmbH"
+
+__license__ = "MIT"
+__maintainer__ = "Patrick Renner, Alexander Sahm"
+__email__ = "opensource@pomfort.com"
+"""
+
+import hashlib
+import os
+import pickle
+from typing import Optional
+
+from . import logger
+from .chain import MHLChainGeneration
+from .hashlist import MHLHashList
+
+# name of the environment variable with the folder of the history cache, the cache is disabled if it is not set
+history_cache_environment_variable = "ASCMHL_HISTORY_CACHE"
+
+# increased whenever the cached classes change in an incompatible way
+history_cache_version = 3
+
+
+class MHLHistoryCache:
+    """
+    class for caching parsed ASC MHL manifests between invocations
+
+    every manifest is stored in a separate pickle file in the cache folder. an entry is only used if the manifest
+    still has the same path, size and modification time, and the chain file still records the same hash for it, so
+    the manifest file stays the source of truth. cached manifests are neither parsed nor hashed again to validate
+    them against the chain file.
+
+    the cache folder must only be writable by the user, since loading a pickle file can execute arbitrary code.
+
+    attribute member variables:
+    cache_folder_path -- folder the cache entries are stored in
+    """
+
+    cache_folder_path: str
+
+    def __init__(self, cache_folder_path: str):
+        self.cache_folder_path = cache_folder_path
+
+    @classmethod
+    def from_environment(cls) -> Optional["MHLHistoryCache"]:
+        """returns the cache for the folder in the ASCMHL_HISTORY_CACHE environment variable, None if not set"""
+        cache_folder_path = os.environ.get(history_cache_environment_variable)
+        if not cache_folder_path:
+            return None
+        return cls(cache_folder_path)
+
+    @staticmethod
+    def entry_key(file_path: str, generation: MHLChainGeneration):
+        """
+        returns the key of the cache entry of a manifest, computed before the manifest is hashed and parsed so later
+        modifications of the manifest invalidate the entry
+        """
+        file_stat = os.stat(file_path)
+        return (
+            history_cache_version,
+            os.path.abspath(file_path),
+            file_stat.st_size,
+            file_stat.st_mtime_ns,
+            generation.hash_format,
+            generation.hash_string,
+        )
+
+    def load_hash_list(self, file_path: str, entry_key) -> Optional[MHLHashList]:
+        """returns the cached hash list of a manifest, None if there is no valid entry for the manifest"""
+        try:
+            with open(self._entry_path(file_path), "rb") as entry_file:
+                entry = pickle.load(entry_file)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            logger.verbose(f"ignoring history cache entry for {file_path}: {error}")
+            return None
+        if not isinstance(entry, dict) or entry.get("key") != entry_key:
+            return None
+        hash_list = entry["hash_list"]
+        hash_list.file_path = file_path
+        return hash_list
+
+    def store_hash_list(self, file_path: str, entry_key, hash_list: MHLHashList):
+        """stores the parsed hash list of a manifest that has been validated against the chain file"""
+        entry_path = self._entry_path(file_path)
+        temporary_entry_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_folder_path, exist_ok=True)
+            with open(temporary_entry_path, "wb") as entry_file:
+                pickle.dump({"key": entry_key, "hash_list": hash_list}, entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+            # replace the entry atomically, concurrent invocations might read it at the same time
+            os.replace(temporary_entry_path, entry_path)
+        except (OSError, pickle.PicklingError) as error:
+            logger.verbose(f"could not write history cache entry for {file_path}: {error}")
+            if os.path.exists(temporary_entry_path):
+                os.remove(temporary_entry_path)
+
+    def _entry_path(self, file_path: str) -> str:
+        file_name = hashlib.sha1(os.path.abspath(file_path).encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.cache_folder_path, f"{file_name}.pickle")
@@ -7,6 +7,9 @@ __maintainer__ = "Jon Waggoner"
 __email__ = "opensource@jonwaggoner.com"
 """
 
+from typing import Dict
+import os
+
 import pathspec
 from . import logger
 
@@ -22,6 +25,8 @@ class MHLIgnoreSpec:
 
     def __init__(self, existing_pattern_list=None, new_pattern_list=None, new_pattern_file=None):
         self._ignore_list = []
+        self._path_spec = None
+        self._matcher = None
         self.set_patterns(existing_pattern_list, new_pattern_list, new_pattern_file)
 
     def set_patterns(self, existing_pattern_list=None, new_pattern_list=None, new_pattern_file=None):
@@ -33,6 +38,8 @@ class MHLIgnoreSpec:
         no duplicates will be added.
         """
         self._ignore_list = []
+        self._path_spec = None
+        self._matcher = None
         if existing_pattern_list:
             self._append_patterns_list(existing_pattern_list)
         else:
@@ -46,8 +53,19 @@ class MHLIgnoreSpec:
         """
         get_path_spec will return a pathspec.PathSpec instance filled with the contents of self.ignore_list
         the returned pathspec.PathSpec instance can be used to match against filepaths.
+        the instance is cached until the patterns are changed, so it must not be modified by the caller.
+        """
+        if self._path_spec is None:
+            self._path_spec = pathspec.PathSpec.from_lines("gitwildmatch", iter(self._ignore_list))
+        return self._path_spec
+
+    def get_matcher(self):
         """
-        return pathspec.PathSpec.from_lines("gitwildmatch", iter(self._ignore_list))
+        get_matcher will return a (cached) MHLIgnoreMatcher compiled from the path spec of self.ignore_list
+        """
+        if self._matcher is None:
+            self._matcher = MHLIgnoreMatcher(self.get_path_spec())
+        return self._matcher
 
     def get_pattern_list(self):
         return self._ignore_list.copy()
@@ -58,6 +76,8 @@ class MHLIgnoreSpec:
         duplicates are ignored.
         """
         if patterns_to_append:
+            self._path_spec = None
+            self._matcher = None
             self._ignore_list.extend(line for line in patterns_to_append if line not in self._ignore_list)
 
     def _append_patterns_from_file(self, filepath):
@@ -77,3 +97,62 @@ class MHLIgnoreSpec:
     # For call to str().
     def __str__(self):
         return str(self._ignore_list)
+
+
+class MHLIgnoreMatcher:
+    """
+    MHLIgnoreMatcher matches relative paths against the patterns of a pathspec.PathSpec.
+
+    the paths are matched by the PathSpec itself, so the results are the same as with PathSpec.match_file. the
+    results of the parent folders are cached for match_with_parents, so the folders of many files are only matched
+    once. directories are matched with a trailing slash, so patterns that only apply to directories (e.g. "folder/")
+    match the directory itself and the whole directory can be skipped.
+    """
+
+    def __init__(self, path_spec: pathspec.PathSpec):
+        self._path_spec = path_spec
+        # cache of the match results of the folders for match_with_parents
+        self._folder_results: Dict[str, bool] = {}
+
+    def match(self, relative_path: str, is_dir: bool = False) -> bool:
+        """
+        returns if a file or folder is ignored, without checking its parent folders
+
+        :param relative_path: the path relative to the root of the traversal, with "/" as separator
+        :param is_dir: whether the path is a directory
+        """
+        if is_dir:
+            relative_path += "/"
+        return self._path_spec.match_file(relative_path)
+
+    def match_with_parents(self, relative_path: str) -> bool:
+        """
+        returns if a path is ignored itself or because one of its parent folders is ignored
+
+        the path is matched as file and as folder, since it isn't known for recorded paths that don't exist anymore.
+        folders that are ignored by directory patterns (e.g. "folder/") might have been recorded by older versions.
+
+        :param relative_path: the path relative to the root of the traversal
+        """
+        relative_path = _posix_path(relative_path)
+        return self._match_folder(relative_path) or self.match(relative_path)
+
+    def _match_folder(self, relative_path: str) -> bool:
+        # collect the parent folders that haven't been matched yet, then match them from the top down
+        unmatched_folders = []
+        result = False
+        while relative_path != "":
+            cached_result = self._folder_results.get(relative_path)
+            if cached_result is not None:
+                result = cached_result
+                break
+            unmatched_folders.append(relative_path)
+            relative_path = relative_path.rpartition("/")[0]
+        for folder in reversed(unmatched_folders):
+            result = result or self.match(folder, is_dir=True)
+            self._folder_results[folder] = result
+        return result
+
+
+def _posix_path(path: str) -> str:
+    return path if os.sep == "/" else path.replace(os.sep, "/")
@@ -7,44 +7,206 @@ __maintainer__ = "Jon Waggoner"
 __email__ = "opensource@jonwaggoner.com"
 """
 
-from os.path import join, isdir
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import os
+import threading
 
 from . import logger
 import pathspec
 from .__version__ import ascmhl_folder_name
+from .ignore import MHLIgnoreMatcher
 
 
-def post_order_lexicographic(top: str, ignore_pathspec: pathspec.PathSpec = None):
+class TraversalEntry:
+    """
+    a file or folder found while traversing a file system
+
+    the stat result is fetched once (from the os.DirEntry of the traversal if available) and cached, so the
+    consumers of the traversal don't need any further stat calls for size and modification date. the relative path
+    is the path relative to the root of the traversal ("." for the root itself), so consumers don't need relpath.
+    """
+
+    __slots__ = ("path", "name", "is_dir", "relative_path", "_dir_entry", "_stat")
+
+    path: str
+    name: str
+    is_dir: bool
+    relative_path: str
+
+    def __init__(
+        self, path: str, name: str, is_dir: bool, dir_entry: Optional[os.DirEntry] = None, relative_path: str = "."
+    ):
+        self.path = path
+        self.name = name
+        self.is_dir = is_dir
+        self.relative_path = relative_path
+        self._dir_entry = dir_entry
+        self._stat = None
+
+    @classmethod
+    def for_path(cls, path: str):
+        return cls(path, os.path.basename(os.path.normpath(path)), os.path.isdir(path))
+
+    def stat(self) -> os.stat_result:
+        """the (cached) stat result of the entry, symlinks are followed like with os.stat"""
+        if self._stat is None:
+            self._stat = self._dir_entry.stat() if self._dir_entry is not None else os.stat(self.path)
+        return self._stat
+
+    def is_symlink(self) -> bool:
+        if self._dir_entry is not None:
+            return self._dir_entry.is_symlink()
+        return os.path.islink(self.path)
+
+
+def post_order_lexicographic(top: str, ignore_pathspec: pathspec.PathSpec = None, jobs: int = 1):
     """
     iterates a file system in the order necessary to generate composite tree hashes, bypassing ignored paths.
 
     :param top: the directory being iterated
     :param ignore_pathspec: the pathspec of ignore patterns to match file exclusions against
+    :param jobs: number of threads listing folders ahead of the traversal, see post_order_lexicographic_entries
     :return: yields results in folder chunks, in the order necessary for composite directory hashes
     """
-    # create a sorted list of our immediate children
-    names = os.listdir(top)
-    names.sort()
+    for folder, children in post_order_lexicographic_entries(top, ignore_pathspec, jobs):
+        # list of tuples. each tuple contains the child name and whether the child is a directory.
+        yield folder.path, [(child.name, child.is_dir) for child in children]
+
+
+def post_order_lexicographic_entries(
+    top: str, ignore_pathspec: pathspec.PathSpec = None, jobs: int = 1, history_folder_callback=None
+):
+    """
+    iterates a file system like post_order_lexicographic, but yields TraversalEntry objects with cached stat results
+
+    the folders are traversed with an explicit stack instead of recursive generators, so deep folder hierarchies
+    neither hit the recursion limit nor pass every entry through the generators of all parent folders.
+
+    with more than one job the sub folders are listed ahead by a thread pool (e.g. for network file systems with a
+    high latency per listing). the folders are still yielded in the same order as with a single job.
+
+    :param top: the directory being iterated
+    :param ignore_pathspec: the pathspec of ignore patterns to match file exclusions against
+    :param jobs: number of threads listing folders ahead of the traversal, with one job folders are listed on demand
+    :param history_folder_callback: optional function called with the entry of every folder containing an ascmhl
+        folder (including top), before any entry inside the folder is yielded (e.g. to load child histories)
+    :return: yields (folder entry, sorted list of child entries) tuples, in the order necessary for directory hashes
+    """
+    # the patterns are matched against the paths relative to top, ignored folders are skipped with all their content
+    ignore_matcher = MHLIgnoreMatcher(ignore_pathspec) if ignore_pathspec else None
+
+    def list_children(folder: TraversalEntry):
+        return _sorted_children(folder, ignore_matcher)
+
+    if jobs <= 1:
+        yield from _post_order_entries(top, list_children, history_folder_callback)
+        return
+
+    with _FolderLister(list_children, jobs) as folder_lister:
+        yield from _post_order_entries(top, folder_lister.children, history_folder_callback)
+
+
+def _post_order_entries(top: str, list_children, history_folder_callback=None):
+    # each stack item holds a folder, its children and an iterator over the sub folders that are still to traverse
+    def stack_item(folder: TraversalEntry):
+        children, ignored_paths = list_children(folder)
+        for ignored_path in ignored_paths:
+            if os.path.basename(ignored_path) != ascmhl_folder_name:
+                logger.verbose(f"ignoring filepath {ignored_path}")
+        if history_folder_callback is not None and _contains_history_folder(children, ignored_paths):
+            history_folder_callback(folder)
+        return folder, children, iter(_sub_folders(children))
+
+    stack = [stack_item(TraversalEntry.for_path(top))]
+    while stack:
+        folder, children, sub_folders = stack[-1]
+        sub_folder = next(sub_folders, None)
+        if sub_folder is not None:
+            stack.append(stack_item(sub_folder))
+        else:
+            # all children have been traversed, yield the current directory and all of it's sorted children.
+            stack.pop()
+            yield folder, children
+
+
+def _contains_history_folder(children: List[TraversalEntry], ignored_paths: List[str]) -> bool:
+    """returns if a folder contains an ascmhl folder (which is usually ignored)"""
+    for ignored_path in ignored_paths:
+        if os.path.basename(ignored_path) == ascmhl_folder_name and os.path.isdir(ignored_path):
+            return True
+    return any(child.name == ascmhl_folder_name and child.is_dir for child in children)
+
+
+def _sub_folders(children: List[TraversalEntry]) -> List[TraversalEntry]:
+    """the child folders the traversal descends into, symlinks to folders are not followed"""
+    return [child for child in children if child.is_dir and not child.is_symlink()]
+
+
+def _sorted_children(
+    folder: TraversalEntry, ignore_matcher: Optional[MHLIgnoreMatcher]
+) -> Tuple[List[TraversalEntry], List[str]]:
+    """
+    returns the sorted entries of the immediate children of a folder that are not ignored, and the ignored paths
+    """
+    relative_prefix = "" if folder.relative_path == "." else folder.relative_path + os.sep
+    # scandir provides the file types without extra stat calls
+    with os.scandir(folder.path) as dir_entries:
+        dir_entries = sorted(dir_entries, key=lambda dir_entry: dir_entry.name)
 
-    # list of tuples. each tuple contains the child name and whether the child is a directory.
     children = []
-    for name in names:
-        file_path = os.path.join(top, name)
-        if ignore_pathspec and ignore_pathspec.match_file(file_path):
-            if os.path.basename(os.path.normpath(file_path)) != ascmhl_folder_name:
-                logger.verbose(f"ignoring filepath {file_path}")
+    ignored_paths = []
+    for dir_entry in dir_entries:
+        file_path = os.path.join(folder.path, dir_entry.name)
+        relative_path = relative_prefix + dir_entry.name
+        is_dir = dir_entry.is_dir()
+        if ignore_matcher and ignore_matcher.match(
+            relative_path if os.sep == "/" else relative_path.replace(os.sep, "/"), is_dir
+        ):
+            ignored_paths.append(file_path)
             continue
-        path = join(top, name)
-        children.append((name, isdir(path)))
-
-    # if directory, yield children recursively in post order until exhausted.
-    for name, is_dir in children:
-        if is_dir:
-            path = join(top, name)
-            if not os.path.islink(path):
-                for x in post_order_lexicographic(path, ignore_pathspec):
-                    yield x
-
-    # now that all children have been traversed, yield the top (current) directory and all of it's sorted children.
-    yield top, children
+        children.append(TraversalEntry(file_path, dir_entry.name, is_dir, dir_entry, relative_path))
+    return children, ignored_paths
+
+
+class _FolderLister:
+    """
+    lists folders on a thread pool ahead of the traversal
+
+    every listed folder schedules the listing of its sub folders, as long as less than max_pending_folders listings
+    are waiting to be picked up by the traversal. folders that haven't been listed ahead are listed on demand.
+    """
+
+    # number of folder listings per thread that are kept ahead of the traversal
+    pending_folders_per_job = 64
+
+    def __init__(self, list_children, jobs: int):
+        self.list_children = list_children
+        self.max_pending_folders = jobs * self.pending_folders_per_job
+        self.executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="ascmhl-lister")
+        self.pending_listings: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # the traversal might have been stopped early, don't list any further folders then
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def children(self, folder: TraversalEntry) -> Tuple[List[TraversalEntry], List[str]]:
+        with self.lock:
+            listing = self.pending_listings.pop(folder.path, None)
+        if listing is None:
+            return self._list(folder)
+        # raises the exception of the listing (if any) at the same point of the traversal as listing on demand
+        return listing.result()
+
+    def _list(self, folder: TraversalEntry) -> Tuple[List[TraversalEntry], List[str]]:
+        children, ignored_paths = self.list_children(folder)
+        with self.lock:
+            for sub_folder in _sub_folders(children):
+                if len(self.pending_listings) >= self.max_pending_folders:
+                    break
+                self.pending_listings[sub_folder.path] = self.executor.submit(self._list, sub_folder)
+        return children, ignored_paths
@@ -0,0 +1,162 @@
+"""
+__author__ = "Patrick Renner, Alexander Sahm"
+__copyright__ = "Copyright 2024, Pomfort GmbH"
+
+__license__ = "MIT"
+__maintainer__ = "Patrick Renner, Alexander Sahm"
+__email__ = "opensource@pomfort.com"
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import closing
+import queue
+import threading
+
+# number of files per worker that are submitted ahead of the file the caller is currently processing
+pending_files_per_job = 4
+# number of traversed folder chunks per worker that are queued ahead of the hashing (and ahead of the caller)
+pending_folders_per_job = 16
+
+
+def map_folder_files(function, folder_chunks, jobs: int = 1, stat_folders: bool = False):
+    """
+    applies a function to all files of the traversed folder chunks and yields the chunks together with the results
+
+    the chunks and results are yielded in the order of the folder chunks, so the caller can feed them into order
+    dependent structures like the directory hash contexts or the generation session. with more than one job the
+    folder chunks are traversed on a separate thread (see prefetch) and the function is called on a thread pool for
+    the files ahead of the chunk the caller is currently processing, so traversal, hashing and the processing of the
+    results overlap. the queues between these stages are bounded, so the memory usage doesn't depend on the size of
+    the traversed tree. threads are used because the hash libraries release the GIL while hashing larger buffers.
+
+    :param function: called with the TraversalEntry of each file (not for directories), must not modify shared state
+    :param folder_chunks: iterable of (folder, children) tuples as yielded by post_order_lexicographic_entries
+    :param jobs: number of worker threads, with one job all files are processed on the calling thread
+    :param stat_folders: fetch the (cached) stat results of the folders while traversing, ahead of the caller
+    :return: yields (folder, children, results) tuples, with one result per child (None for directories)
+    """
+    if jobs <= 1:
+        for folder, children in folder_chunks:
+            results = [None if child.is_dir else function(child) for child in children]
+            yield folder, children, results
+        return
+
+    def stat_folder(folder_chunk):
+        folder, _ = folder_chunk
+        folder.stat()
+
+    max_pending_files = jobs * pending_files_per_job
+    max_pending_chunks = jobs * pending_folders_per_job
+    folder_chunks = prefetch(folder_chunks, max_pending_chunks, stat_folder if stat_folders else None)
+    with closing(folder_chunks), ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="ascmhl-worker") as executor:
+        # the chunks that haven't been handed out yet, only the last one might not be submitted completely
+        pending_chunks = deque()
+        # the submitted files that might not be done yet, in the order of submission
+        pending_futures = deque()
+        try:
+            for folder, children in folder_chunks:
+                futures = []
+                pending_chunks.append((folder, children, futures))
+                for child in children:
+                    if child.is_dir:
+                        futures.append(None)
+                        continue
+                    # submit the files of a chunk one by one, so large folders don't queue all their files at once
+                    while len(pending_futures) >= max_pending_files:
+                        if len(pending_chunks) > 1:
+                            yield _resolved_chunk(pending_chunks.popleft())
+                        else:
+                            wait((pending_futures[0],))
+                        _remove_done_futures(pending_futures)
+                    future = executor.submit(function, child)
+                    futures.append(future)
+                    pending_futures.append(future)
+
+                # only hand out chunks once enough files are queued behind them to keep all workers busy. chunks
+                # without files (e.g. of empty folders) are limited as well
+                while pending_chunks and (
+                    len(pending_futures) >= max_pending_files or len(pending_chunks) > max_pending_chunks
+                ):
+                    yield _resolved_chunk(pending_chunks.popleft())
+                    _remove_done_futures(pending_futures)
+
+            while pending_chunks:
+                yield _resolved_chunk(pending_chunks.popleft())
+        finally:
+            # the caller might stop early (e.g. due to an exception), don't process the remaining files then
+            for _, _, futures in pending_chunks:
+                for future in futures:
+                    if future is not None:
+                        future.cancel()
+
+
+def _remove_done_futures(pending_futures: deque):
+    """removes the done futures from the start of the pending futures"""
+    while pending_futures and pending_futures[0].done():
+        pending_futures.popleft()
+
+
+def _resolved_chunk(chunk):
+    """waits for all results of a chunk, raises the exception of the first failed file (in traversal order)"""
+    folder, children, futures = chunk
+    results = [None if future is None else future.result() for future in futures]
+    return folder, children, results
+
+
+def prefetch(items, max_pending_items: int, prepare=None):
+    """
+    iterates items on a separate thread and yields them in order, with up to max_pending_items ahead of the caller
+
+    exceptions of the iteration are raised to the caller when it reaches them. if the caller stops early, the
+    iteration is stopped (and closed) as well.
+
+    :param items: the iterable to iterate, it is only used from the prefetching thread
+    :param max_pending_items: the maximum number of items waiting in the queue
+    :param prepare: optional function called with each item on the prefetching thread before it is queued
+    """
+    pending_items = queue.Queue(maxsize=max_pending_items)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # don't block forever on a full queue, the caller might have stopped
+        while not stopped.is_set():
+            try:
+                pending_items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if prepare is not None:
+                    prepare(item)
+                if not put((item, None)):
+                    return
+            put((_end_of_items, None))
+        except BaseException as exception:
+            put((_end_of_items, exception))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name="ascmhl-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exception = pending_items.get()
+            if item is _end_of_items:
+                if exception is not None:
+                    raise exception
+                return
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+_end_of_items = object()
@@ -8,6 +8,7 @@ __email__ = "opensource@pomfort.com"
 """
 
 import os
+import shutil
 from freezegun import freeze_time
 from click.testing import CliRunner
 
@@ -361,3 +362,101 @@ def test_create_mulitple_hashformats_double_hashformat(fs, simple_mhl_history):
         print(result.output)
 
     assert result.exit_code == 0
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_create_parallel_jobs(fs):
+    fs.create_file("/root/Stuff.txt", contents="stuff\n")
+    for folder in ["A", "B", "B/BA"]:
+        for index in range(5):
+            fs.create_file(f"/root/{folder}/file{index}.txt", contents=f"{folder}{index}\n")
+    os.mkdir("/root/emptyFolder")
+
+    runner = CliRunner()
+    result = runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-h", "md5", "-j", "4"])
+    assert result.exit_code == 0
+    with open("/root/ascmhl/0001_root_2020-01-16_091500Z.mhl", "rb") as file:
+        parallel_manifest = file.read()
+
+    # the serial run results in the exact same manifest
+    shutil.rmtree("/root/ascmhl")
+    result = runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-h", "md5"])
+    assert result.exit_code == 0
+    with open("/root/ascmhl/0001_root_2020-01-16_091500Z.mhl", "rb") as file:
+        assert file.read() == parallel_manifest
+
+    # verifying with multiple jobs also reports failures
+    with open("/root/B/file3.txt", "a") as file:
+        file.write("!!")
+    result = runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-j", "4"])
+    assert result.exit_code == 11
+    assert "ERROR: hash mismatch for        B/file3.txt" in result.output
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_create_history_hash_entry_index(fs):
+    fs.create_file("/root/Stuff.txt", contents="stuff\n")
+    fs.create_file("/root/A/A1.txt", contents="A1\n")
+
+    runner = CliRunner()
+    assert not runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64"]).exception
+    assert not runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-h", "md5"]).exception
+
+    history = MHLHistory.load_from_path("/root")
+    original_hash_entry = history.find_original_hash_entry_for_path("A/A1.txt")
+    assert original_hash_entry.hash_format == "xxh64"
+    assert original_hash_entry.media_hash is history.hash_lists[0].find_media_hash_for_path("A/A1.txt")
+    assert history.find_first_hash_entry_for_path("A/A1.txt") is original_hash_entry
+    assert history.find_first_hash_entry_for_path("A/A1.txt", "md5").media_hash is history.hash_lists[
+        1
+    ].find_media_hash_for_path("A/A1.txt")
+    assert history.find_first_hash_entry_for_path("A/A1.txt", "sha1") is None
+    assert history.find_existing_hash_formats_for_path("A/A1.txt") == ["xxh64", "md5"]
+    assert history.find_original_hash_entry_for_path("B/B1.txt") is None
+    assert history.find_existing_hash_formats_for_path("B/B1.txt") == []
+
+    directory_hash_entries = history.find_directory_hash_entries_for_path("A")
+    assert [(entry.temp_generation_number, entry.hash_format) for entry in directory_hash_entries] == [
+        (1, "xxh64"),
+        (2, "md5"),
+        (2, "xxh64"),
+    ]
+    assert history.find_directory_hash_entries_for_path("A/A1.txt") == []
+
+    # the index is updated when a new generation is written
+    fs.create_file("/root/B/B1.txt", contents="B1\n")
+    session = ascmhl.commands.MHLGenerationCreationSession(history)
+    ascmhl.commands.seal_file_path(history, "/root/B/B1.txt", ["xxh64"], session)
+    ascmhl.commands.commit_session(session, None, None, None, None, None, None)
+    assert history.find_original_hash_entry_for_path("B/B1.txt").hash_format == "xxh64"
+    assert history.find_existing_hash_formats_for_path("B/B1.txt") == ["xxh64"]
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_create_finds_child_histories_while_traversing(fs, nested_mhl_histories, monkeypatch):
+    # the child histories have been created after the root history, so they are not referenced yet
+    assert MHLHistory.load_from_path("/root", find_child_histories=False).child_histories == []
+
+    def fail(root_path):
+        raise AssertionError("the file system tree was traversed while loading the history")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ascmhl.history, "_find_child_history_paths", fail)
+        result = CliRunner().invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-j", "4"])
+        assert result.exit_code == 0
+
+        # the new generations reference the child histories, which are loaded from the references now
+        history = MHLHistory.load_from_path("/root", find_child_histories=False)
+    walked_history = MHLHistory.load_from_path("/root")
+    assert history.child_history_mappings.keys() == {"A/AA", "B", os.path.join("B", "BB")}
+    assert walked_history.child_history_mappings.keys() == history.child_history_mappings.keys()
+    assert history.child_histories[1].child_histories[0].get_root_path() == "/root/B/BB"
+
+    # child histories that aren't referenced yet are still recorded in their own history
+    result = CliRunner().invoke(ascmhl.commands.create, ["/root/A/AB", "-h", "xxh64"])
+    assert result.exit_code == 0
+    result = CliRunner().invoke(ascmhl.commands.create, ["/root", "-h", "xxh64"])
+    assert result.exit_code == 0
+    history = MHLHistory.load_from_path("/root", find_child_histories=False)
+    assert [h.get_root_path() for h in history.child_histories] == ["/root/A/AA", "/root/A/AB", "/root/B"]
+    assert history.child_histories[1].hash_lists[-1].find_media_hash_for_path("AB1.txt") is not None
@@ -7,7 +7,10 @@ __maintainer__ = "Patrick Renner, Alexander Sahm"
 __email__ = "opensource@pomfort.com"
 """
 
+import hashlib
+import mmap
 import pytest
+import ascmhl.hasher
 from ascmhl.hasher import *
 
 
@@ -149,3 +152,188 @@ def test_hash_list_concat_equals_chunking():
         concat = hasher.bytes_from_string_digest("".join(hash_list))
         h2 = hasher.hash_data(concat)
         assert h1 == h2  # assert that sequentially feeding hashes is same as concat then feeding hashes
+
+
+def test_hash_file_in_chunks(fs):
+    # a file spanning multiple chunks (including a partial last chunk) is read ahead in the background
+    file, data = "/data-file.txt", b"media-hash-list" * 100
+    fs.create_file(file, contents=data)
+    for chunk_size in [1, 7, 15, len(data), len(data) + 1]:
+        for hash_type in HashType:
+            assert hash_file(file, hash_type.name, chunk_size) == hash_data(data, hash_type.name)
+        hash_lookup = multiple_format_hash_file(file, ["md5", "xxh64", "c4"], chunk_size)
+        assert hash_lookup == multiple_format_hash_data(data, ["md5", "xxh64", "c4"])
+
+    # an empty file results in the hash of no data
+    fs.create_file("/empty-file.txt")
+    assert hash_file("/empty-file.txt", "xxh64", 7) == hash_data(b"", "xxh64")
+
+
+def test_hash_mapped_file(tmp_path):
+    # memory mapping needs a real file, so this test doesn't use the fake file system
+    file, data = tmp_path / "data-file.txt", b"media-hash-list" * 100
+    file.write_bytes(data)
+    for chunk_size in [7, len(data) + 1]:
+        for hash_type in HashType:
+            assert hash_file(str(file), hash_type.name, chunk_size, IOBackend.mmap) == hash_data(data, hash_type.name)
+        hash_lookup = multiple_format_hash_file(str(file), ["md5", "xxh64", "c4"], chunk_size, IOBackend.mmap)
+        assert hash_lookup == multiple_format_hash_data(data, ["md5", "xxh64", "c4"])
+
+
+def test_small_file_is_not_mapped(tmp_path, monkeypatch):
+    # files that fit into a single chunk are read instead of mapped, also with the mmap io backend
+    file, data = tmp_path / "data-file.txt", b"media-hash-list"
+    file.write_bytes(data)
+    mapped_file_descriptors = []
+    original_mmap = mmap.mmap
+
+    def recording_mmap(file_descriptor, *args, **kwargs):
+        mapped_file_descriptors.append(file_descriptor)
+        return original_mmap(file_descriptor, *args, **kwargs)
+
+    monkeypatch.setattr(mmap, "mmap", recording_mmap)
+    assert hash_file(str(file), "xxh64", len(data), IOBackend.mmap) == hash_data(data, "xxh64")
+    assert mapped_file_descriptors == []
+    assert hash_file(str(file), "xxh64", len(data) - 1, IOBackend.mmap) == hash_data(data, "xxh64")
+    assert len(mapped_file_descriptors) == 1
+
+
+def test_direct_io_buffers_are_closed(tmp_path, monkeypatch):
+    # the anonymous mappings used as aligned buffers are closed when the file is read or the reading stops early
+    file, data = tmp_path / "data-file.txt", b"media-hash-list" * 1000
+    file.write_bytes(data)
+    buffers = []
+    original_mmap = mmap.mmap
+
+    def recording_mmap(file_descriptor, *args, **kwargs):
+        buffer = original_mmap(file_descriptor, *args, **kwargs)
+        if file_descriptor == -1:
+            buffers.append(buffer)
+        return buffer
+
+    monkeypatch.setattr(mmap, "mmap", recording_mmap)
+    for chunk_size in [4096, len(data) + 1]:
+        assert hash_file(str(file), "xxh64", chunk_size, IOBackend.direct) == hash_data(data, "xxh64")
+    with open(file, "rb") as opened_file:
+        chunks = ascmhl.hasher._direct_file_chunks(opened_file, str(file), 4096)
+        next(chunks)
+        chunks.close()
+    # O_DIRECT isn't supported by all file systems, the buffers are only used if it is
+    assert all(buffer.closed for buffer in buffers)
+
+
+def test_hash_file_with_io_backends(tmp_path):
+    # the uncached and direct backends need a real file, so this test doesn't use the fake file system
+    file, data = tmp_path / "data-file.txt", b"media-hash-list" * 1000
+    file.write_bytes(data)
+    for io_backend in IOBackend:
+        for chunk_size in [7, 4096, len(data) + 1]:
+            assert hash_file(str(file), "xxh64", chunk_size, io_backend) == hash_data(data, "xxh64")
+            hash_lookup = multiple_format_hash_file(str(file), ["md5", "xxh64", "c4"], chunk_size, io_backend)
+            assert hash_lookup == multiple_format_hash_data(data, ["md5", "xxh64", "c4"])
+
+
+def test_hash_file_in_parallel(fs, monkeypatch):
+    # hash all formats of the file in parallel, the thread pool is shared by all files
+    monkeypatch.setattr(ascmhl.hasher, "parallel_hashing_min_file_size", 1)
+    data = b"media-hash-list" * 100
+    fs.create_file("/data-file.txt", contents=data)
+    for chunk_size in [7, len(data) + 1]:
+        hash_lookup = multiple_format_hash_file("/data-file.txt", ["md5", "xxh64", "c4"], chunk_size)
+        assert hash_lookup == multiple_format_hash_data(data, ["md5", "xxh64", "c4"])
+    assert ascmhl.hasher._hasher_executor() is ascmhl.hasher._hasher_executor()
+
+
+def test_c4_encoding():
+    # digits of all values and the padding of small values with the C4 zero '1'
+    for digest in [bytes(64), bytes(63) + b"\x01", b"\xff" * 64, hashlib.sha512(b"media-hash-list").digest()]:
+        c4_string = c4_string_from_digest(digest)
+        expected_value = int.from_bytes(digest, byteorder="big")
+        assert len(c4_string) == 90 and c4_string.startswith("c4")
+        assert sum(C4.charset.index(c) * 58**i for i, c in enumerate(reversed(c4_string[2:]))) == expected_value
+        assert c4_digest_from_string(c4_string) == digest
+    assert c4_string_from_digest(bytes(64)) == "c4" + "1" * 88
+
+    with pytest.raises(ValueError):
+        c4_digest_from_string("c4" + "0" * 88)
+    with pytest.raises(ValueError):
+        c4_digest_from_string("c4" + "1" * 87)
+
+
+def test_multiple_format_directory_hash_context():
+    hash_formats = ["c4", "md5", "xxh64"]
+    file_hashes = {name: multiple_format_hash_data(name.encode("utf8"), hash_formats) for name in ["b.txt", "a.txt"]}
+    sub_folder_content_hashes = multiple_format_hash_data(b"content", hash_formats)
+    sub_folder_structure_hashes = multiple_format_hash_data(b"structure", hash_formats)
+
+    context = MultipleFormatDirectoryHashContext(hash_formats)
+    for name, hash_lookup in file_hashes.items():
+        context.append_file_hashes(f"/root/{name}", hash_lookup)
+    context.append_directory_hashes("/root/sub/", sub_folder_content_hashes, sub_folder_structure_hashes)
+    content_hash_lookup = context.final_content_hash_lookup()
+    structure_hash_lookup = context.final_structure_hash_lookup()
+
+    # the hashes of the sorted child hash strings, structure hashes additionally include the child names
+    for hash_format in hash_formats:
+        hasher = new_hasher_for_hash_type(hash_format)
+        content_hashes = [hash_lookup[hash_format] for hash_lookup in file_hashes.values()]
+        content_hashes.append(sub_folder_content_hashes[hash_format])
+        assert content_hash_lookup[hash_format] == hasher.hash_of_hash_list(content_hashes)
+        structure_hashes = [
+            hasher.hash_data(name.encode("utf8") + hasher.bytes_from_string_digest(hash_lookup[hash_format]))
+            for name, hash_lookup in file_hashes.items()
+        ]
+        structure_hashes.append(
+            hasher.hash_data(b"sub" + hasher.bytes_from_string_digest(sub_folder_structure_hashes[hash_format]))
+        )
+        assert structure_hash_lookup[hash_format] == hasher.hash_of_hash_list(structure_hashes)
+
+    # an empty folder has the hash of no data
+    context = MultipleFormatDirectoryHashContext(hash_formats)
+    assert context.final_content_hash_lookup() == multiple_format_hash_data(b"", hash_formats)
+
+
+def test_hash_digest():
+    data = b"media-hash-list"
+    for hash_type in HashType:
+        hasher = new_hasher_for_hash_type(hash_type.name)
+        hasher.update(data)
+        digest = hasher.digest()
+        hash_string = hash_data(data, hash_type.name)
+        # digests are encoded and decoded lazily and compare equal in either representation
+        assert digest.hash_string == str(digest) == hash_string
+        assert HashDigest(hash_type.name, hash_string=hash_string).digest_bytes == digest.digest_bytes
+        assert HashDigest(hash_type.name, hash_string=hash_string) == digest
+        assert HashDigest.from_value(hash_type.name, hash_string) == HashDigest.from_value(hash_type.name, digest)
+
+    assert HashDigest("xxh64", bytes(8)) != HashDigest("xxh64", b"\x01" * 8)
+    assert HashDigest("xxh64", bytes(8)) != HashDigest("xxh3", bytes(8))
+    assert HashDigest.from_value("xxh64", None) is None
+
+
+def test_hash_backend_registry(fs, monkeypatch):
+    monkeypatch.setattr(ascmhl.hasher, "_hash_backends", {k: dict(v) for k, v in ascmhl.hasher._hash_backends.items()})
+    monkeypatch.setattr(ascmhl.hasher, "_selected_hash_backend_names", dict(ascmhl.hasher._selected_hash_backend_names))
+    backend_calls = []
+
+    def test_backend(data=b""):
+        backend_calls.append(data)
+        return xxhash.xxh64(data)
+
+    data = b"media-hash-list"
+    fs.create_file("/data-file.txt", contents=data)
+    expected_hash_string = hash_data(data, "xxh64")
+
+    # registering doesn't change the selected backend
+    register_hash_backend("xxh64", "test", test_backend)
+    assert hash_backend_names("xxh64")[-1] == "test"
+    assert hash_file("/data-file.txt", "xxh64") == expected_hash_string
+    assert not backend_calls
+
+    select_hash_backend("xxh64", "test")
+    assert selected_hash_backend_name("xxh64") == "test"
+    assert hash_file("/data-file.txt", "xxh64") == expected_hash_string
+    assert backend_calls
+
+    with pytest.raises(ValueError):
+        select_hash_backend("xxh64", "unknown")
@@ -13,6 +13,7 @@ from click.testing import CliRunner
 from lxml import etree
 from testfixtures import TempDirectory
 import ascmhl.commands
+from ascmhl.ignore import MHLIgnoreSpec
 
 
 XML_IGNORE_TAG = "pattern"
@@ -219,3 +220,97 @@ def test_ignore_on_nested_histories(temp_tree):
 
     result = runner.invoke(ascmhl.commands.verify, [root_dir])
     assert not result.exception
+
+
+def test_ignore_matcher():
+    """
+    tests that the compiled matcher matches relative paths like the pathspec, and directories with trailing slashes
+    """
+    patterns = ["*.txt", "!b.txt", "1/11", "12/", "#comment", "", "/2/11/f.txt"]
+    ignore_spec = MHLIgnoreSpec(new_pattern_list=patterns)
+    path_spec = ignore_spec.get_path_spec()
+    matcher = ignore_spec.get_matcher()
+    assert ignore_spec.get_path_spec() is path_spec
+    assert ignore_spec.get_matcher() is matcher
+
+    for path in ["a.txt", "b.txt", "1/b.txt", "1/c.md", "1/11", "2/1/11", "2/11/f.txt", "x/2/11/f.txt", "ascmhl"]:
+        assert matcher.match(path) == path_spec.match_file(path), path
+    assert matcher.match("1/12", is_dir=True)
+    assert not matcher.match("1/12")
+    assert matcher.match("ascmhl", is_dir=True)
+
+    assert matcher.match_with_parents("1/11/b.txt")
+    assert matcher.match_with_parents("3/12/d.md")
+    assert not matcher.match_with_parents("3/b.txt")
+
+    # changing the patterns invalidates the cached instances
+    ignore_spec.set_patterns(new_pattern_list=["*.md"])
+    assert ignore_spec.get_matcher() is not matcher
+    assert ignore_spec.get_matcher().match_with_parents("3/12/d.md")
+    assert not ignore_spec.get_matcher().match_with_parents("3/12/d.txt")
+
+
+def test_ignore_matcher_matches_like_path_spec():
+    """
+    tests that the matcher matches exactly like PathSpec.match_file, also for unanchored and directory patterns
+    """
+    pattern_lists = [["*/"], ["**/"], ["dir/"], ["*.txt", "!keep.txt"], ["/anchored"], ["dir/", "!dir/keep/"]]
+    paths = [
+        "a.txt",
+        "keep.txt",
+        "b/",
+        "b/c",
+        "b/c/",
+        "dir",
+        "dir/",
+        "dir/a.txt",
+        "dir/keep/",
+        "dir/keep/keep.txt",
+        "x/dir/",
+        "anchored",
+        "anchored/",
+        "x/anchored",
+    ]
+    for patterns in pattern_lists:
+        ignore_spec = MHLIgnoreSpec(new_pattern_list=patterns)
+        path_spec = ignore_spec.get_path_spec()
+        matcher = ignore_spec.get_matcher()
+        for path in paths:
+            assert matcher.match(path) == path_spec.match_file(path), (patterns, path)
+            if not path.endswith("/"):
+                assert matcher.match(path, is_dir=True) == path_spec.match_file(path + "/"), (patterns, path)
+
+
+def test_ignore_anchored_patterns(temp_tree):
+    """
+    tests that patterns are matched relative to the root path, and that ignored folders are skipped completely
+    """
+    runner = CliRunner()
+    root_dir, mhl_dir = f"{temp_tree.path}", f"{temp_tree.path}/ascmhl"
+
+    assert runner.invoke(ascmhl.commands.create, [root_dir, "-i", "/1/11", "-i", "12/"]).exit_code == 0
+    gen_1_paths = paths_from_mhl_file(mhl_file_for_gen(mhl_dir, 1))
+    assert "1/c.txt" in gen_1_paths
+    assert "2/11/f.txt" in gen_1_paths
+    for ignored_path in ["1/11", "1/11/d.txt", "1/12", "1/12/e.txt", "2/12", "2/12/g.txt"]:
+        assert ignored_path not in gen_1_paths
+
+    # the files in the ignored folders are not reported as missing
+    assert runner.invoke(ascmhl.commands.diff, [root_dir, "-i", "/1/11", "-i", "12/"]).exit_code == 0
+
+
+def test_ignore_recorded_folder_with_directory_pattern(temp_tree):
+    """
+    tests that recorded folders that are ignored by a directory pattern later (or that have been recorded by older
+    versions despite the pattern) are not reported as missing
+    """
+    runner = CliRunner()
+    root_dir, mhl_dir = f"{temp_tree.path}", f"{temp_tree.path}/ascmhl"
+
+    assert runner.invoke(ascmhl.commands.create, [root_dir]).exit_code == 0
+    assert "2" in paths_from_mhl_file(mhl_file_for_gen(mhl_dir, 1))
+
+    # the ignored folder itself is skipped, its recorded path must not be reported as missing
+    assert runner.invoke(ascmhl.commands.diff, [root_dir, "-i", "2/"]).exit_code == 0
+    assert runner.invoke(ascmhl.commands.verify, [root_dir, "-i", "2/"]).exit_code == 0
+    assert runner.invoke(ascmhl.commands.create, [root_dir, "-i", "2/"]).exit_code == 0
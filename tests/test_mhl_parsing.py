@@ -9,10 +9,11 @@ __email__ = "opensource@pomfort.com"
 
 import os
 import re
+import pytest
 from freezegun import freeze_time
 from click.testing import CliRunner
 
-from ascmhl import hashlist_xml_parser
+from ascmhl import errors, hashlist_xml_parser
 from ascmhl.__version__ import ascmhl_file_extension
 from ascmhl.history import MHLHistory
 import ascmhl.commands
@@ -59,6 +60,20 @@ def test_child_history_parsing(fs, nested_mhl_histories):
     assert root_history.find_history_for_path("B/BB/BB1.txt")[0] == bb_history
     assert root_history.find_history_for_path("B")[0] == b_history
 
+    # and the paths relative to the found histories
+    assert root_history.find_history_for_path("A/AB/AB1.txt") == (root_history, "A/AB/AB1.txt")
+    assert root_history.find_history_for_path("A/AA/AA1.txt") == (aa_history, "AA1.txt")
+    assert root_history.find_history_for_path("B/BA/BA1.txt") == (b_history, "BA/BA1.txt")
+    assert root_history.find_history_for_path("B/BB/BB1.txt") == (bb_history, "BB1.txt")
+    assert root_history.find_history_for_path("B/BB") == (bb_history, ".")
+    assert root_history.find_history_for_path("B/BBB/BB1.txt") == (b_history, "BBB/BB1.txt")
+    assert b_history.find_history_for_path("BB/BB1.txt") == (bb_history, "BB1.txt")
+
+    # relative paths are computed like with relpath
+    for path in ["/root", "/root/A/AA/AA1.txt", "/root/A/./AA1.txt", "/root/A//A1.txt", "/root/../A/A1.txt", "/rooted"]:
+        assert root_history.get_relative_file_path(path) == os.path.relpath(path, "/root")
+    assert bb_history.get_relative_file_path("/root/B/BB/BB1.txt") == "BB1.txt"
+
     # the history object should only return the media hashes and hash entries it contains directly
     # if we need th entries from child histories we have to ask them directly
     assert root_history.find_original_hash_entry_for_path("Stuff.txt") is not None
@@ -217,3 +232,146 @@ def test_hash_list_name_parsing():
     _test_regex("0001_AA_2020-01-16_091500.xml", False)
     _test_regex("AA_2020-01-16_091500_0002.mhl", False)
     _test_regex("0003_.mhl", False)
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_history_cache(fs, nested_mhl_histories, monkeypatch):
+    monkeypatch.setenv("ASCMHL_HISTORY_CACHE", "/cache")
+    history = MHLHistory.load_from_path("/root")
+    # one entry per manifest of the root history and the child histories
+    num_hash_lists = sum(len(h.hash_lists) for h in MHLHistory.walk_child_histories(history))
+    assert len(os.listdir("/cache")) == num_hash_lists
+
+    # unchanged manifests are neither parsed nor hashed again
+    def fail(*args, **kwargs):
+        raise AssertionError("manifest was not loaded from the cache")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(hashlist_xml_parser, "parse", fail)
+        patch.setattr(ascmhl.hasher, "hash_file", fail)
+        cached_history = MHLHistory.load_from_path("/root")
+    assert [hash_list.file_path for hash_list in cached_history.hash_lists] == [
+        hash_list.file_path for hash_list in history.hash_lists
+    ]
+    assert cached_history.find_original_hash_entry_for_path("Stuff.txt").hash_string == (
+        history.find_original_hash_entry_for_path("Stuff.txt").hash_string
+    )
+    assert cached_history.child_history_mappings.keys() == history.child_history_mappings.keys()
+
+    # the manifests stay the source of truth, modified manifests are validated again
+    manifest_path = history.hash_lists[0].file_path
+    with open(manifest_path, "a") as manifest_file:
+        manifest_file.write("\n")
+    with pytest.raises(errors.ModifiedMHLManifestFileException):
+        MHLHistory.load_from_path("/root")
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_lazy_history_loading(fs, nested_mhl_histories):
+    history = MHLHistory.load_from_path("/root")
+    lazy_history = MHLHistory.load_from_path("/root", lazy=True)
+
+    # only the headers are parsed when loading
+    hash_list = lazy_history.hash_lists[-1]
+    assert hash_list.pending_hashes_file_path == hash_list.file_path
+    assert hash_list._media_hashes == []
+    assert hash_list.creator_info.creation_date == history.hash_lists[-1].creator_info.creation_date
+    assert hash_list.process_info.root_media_hash is not None
+
+    # the hashes are parsed on the first query
+    assert lazy_history.find_original_hash_entry_for_path("Stuff.txt").hash_string == (
+        history.find_original_hash_entry_for_path("Stuff.txt").hash_string
+    )
+    assert hash_list.pending_hashes_file_path is None
+    assert [media_hash.path for media_hash in hash_list.media_hashes] == [
+        media_hash.path for media_hash in history.hash_lists[-1].media_hashes
+    ]
+    assert len(hash_list.hash_list_references) == len(history.hash_lists[-1].hash_list_references)
+    assert lazy_history.child_history_mappings.keys() == history.child_history_mappings.keys()
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_lazy_history_loading_indexes_needed_generations(fs, simple_mhl_history):
+    fs.create_file("/root/B/B1.txt", contents="B1\n")
+    runner = CliRunner()
+    result = runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-h", "md5"])
+    assert result.exit_code == 0
+
+    history = MHLHistory.load_from_path("/root")
+    lazy_history = MHLHistory.load_from_path("/root", lazy=True)
+    first_hash_list, second_hash_list = lazy_history.hash_lists
+
+    # the original hash of a file of the first generation only needs the hashes of the first generation
+    assert lazy_history.find_original_hash_entry_for_path("Stuff.txt").hash_string == (
+        history.find_original_hash_entry_for_path("Stuff.txt").hash_string
+    )
+    assert lazy_history.find_first_hash_entry_for_path("A/A1.txt", "xxh64") is not None
+    assert first_hash_list.pending_hashes_file_path is None
+    assert second_hash_list.pending_hashes_file_path == second_hash_list.file_path
+
+    # the hash formats of a path depend on all generations
+    assert lazy_history.find_existing_hash_formats_for_path("Stuff.txt") == ["xxh64", "md5"]
+    assert second_hash_list.pending_hashes_file_path is None
+    assert lazy_history.find_original_hash_entry_for_path("B/B1.txt").hash_string == (
+        history.find_original_hash_entry_for_path("B/B1.txt").hash_string
+    )
+
+    # the resumed parsing results in the same hashes and references as parsing the whole file
+    for lazy_hash_list, hash_list in zip(lazy_history.hash_lists, history.hash_lists):
+        assert lazy_hash_list.media_hashes_path_map.keys() == hash_list.media_hashes_path_map.keys()
+        assert [media_hash.path for media_hash in lazy_hash_list.media_hashes] == [
+            media_hash.path for media_hash in hash_list.media_hashes
+        ]
+        assert len(lazy_hash_list.hash_list_references) == len(hash_list.hash_list_references)
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_parallel_history_loading(fs, nested_mhl_histories):
+    history = MHLHistory.load_from_path("/root")
+    parallel_history = MHLHistory.load_from_path("/root", jobs=4)
+
+    # the histories are assembled in the same order as with a single job
+    histories = list(MHLHistory.walk_child_histories(history))
+    parallel_histories = list(MHLHistory.walk_child_histories(parallel_history))
+    assert [h.get_root_path() for h in parallel_histories] == [h.get_root_path() for h in histories]
+    for h, parallel_h in zip(histories, parallel_histories):
+        assert [(hl.file_path, hl.generation_number) for hl in parallel_h.hash_lists] == [
+            (hl.file_path, hl.generation_number) for hl in h.hash_lists
+        ]
+        assert parallel_h.child_history_mappings.keys() == h.child_history_mappings.keys()
+        assert [len(hl.referenced_hash_lists) for hl in parallel_h.hash_lists] == [
+            len(hl.referenced_hash_lists) for hl in h.hash_lists
+        ]
+    assert parallel_history.child_histories[0].parent_history is parallel_history
+
+    # modified manifests are still reported
+    with open(history.child_histories[0].hash_lists[0].file_path, "a") as manifest_file:
+        manifest_file.write("\n")
+    with pytest.raises(errors.ModifiedMHLManifestFileException):
+        MHLHistory.load_from_path("/root", jobs=4)
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_manifests_hashed_once(fs, nested_mhl_histories, monkeypatch):
+    hashed_manifest_paths = []
+    hash_file = ascmhl.hasher.hash_file
+
+    def counting_hash_file(file_path, hash_format, *args, **kwargs):
+        if file_path.endswith(ascmhl_file_extension):
+            hashed_manifest_paths.append(file_path)
+        return hash_file(file_path, hash_format, *args, **kwargs)
+
+    monkeypatch.setattr(ascmhl.hasher, "hash_file", counting_hash_file)
+    monkeypatch.setattr(ascmhl.hashlist, "hash_file", counting_hash_file)
+
+    # the hashes of the chain files are reused for resolving the references between the histories
+    history = MHLHistory.load_from_path("/root")
+    assert len(hashed_manifest_paths) == sum(len(h.hash_lists) for h in MHLHistory.walk_child_histories(history))
+    assert len(set(hashed_manifest_paths)) == len(hashed_manifest_paths)
+
+    # new manifests are hashed once for the chain file and the reference in the parent history
+    fs.create_file("/root/B/BB/BB2.txt", contents="BB2\n")
+    hashed_manifest_paths.clear()
+    result = CliRunner().invoke(ascmhl.commands.create, ["/root", "-h", "xxh64"])
+    assert result.exit_code == 0
+    assert len(set(hashed_manifest_paths)) == len(hashed_manifest_paths)
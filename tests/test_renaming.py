@@ -13,6 +13,7 @@ from freezegun import freeze_time
 
 import ascmhl
 from ascmhl import hasher
+from ascmhl.history import MHLHistory
 
 
 @freeze_time("2020-01-16 09:15:00")
@@ -258,3 +259,68 @@ def test_detect_renamed_folders(fs):
     result = runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-v", "-dr"])
     assert "a renamed" not in result.output
     assert not result.exception
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_history_path_index_for_renamed_files(fs):
+    fs.create_file("/root/A/AA1.txt", contents="AA1\n")
+    fs.create_file("/root/B1.txt", contents="B1\n")
+
+    runner = CliRunner()
+    assert not runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64"]).exception
+    os.rename("/root/A/AA1.txt", "/root/A/AA1_renamed.txt")
+    assert not runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-dr"]).exception
+    os.rename("/root/A/AA1_renamed.txt", "/root/A/AA1_renamed_again.txt")
+    assert not runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64", "-dr"]).exception
+
+    history = MHLHistory.load_from_path("/root")
+    assert len(history.find_media_hashes_for_path("B1.txt")) == 3
+    assert len(history.find_media_hashes_for_path("A/AA1.txt")) == 1
+    assert history.find_media_hashes_for_path("A/AA1_renamed.txt")[0].previous_path == "A/AA1.txt"
+    assert history.find_media_hashes_for_path("C.txt") == []
+
+    assert history.find_original_path_for_path("A/AA1_renamed.txt") == "A/AA1.txt"
+    assert history.find_original_path_for_path("B1.txt") == "B1.txt"
+    assert history.renamed_path_with_previous_path() == {
+        "/root/A/AA1.txt": "/root/A/AA1_renamed.txt",
+        "/root/A/AA1_renamed.txt": "/root/A/AA1_renamed_again.txt",
+    }
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_detect_renamed_files_hashes_new_files_once(fs, monkeypatch):
+    fs.create_file("/root/A/A1.txt", contents="A1\n")
+    fs.create_file("/root/A/A2.txt", contents="A2\n")
+    fs.create_file("/root/B/B1.txt", contents="B1\n")
+
+    runner = CliRunner()
+    assert not runner.invoke(ascmhl.commands.create, ["/root", "-h", "xxh64"]).exception
+
+    os.rename("/root/A/A1.txt", "/root/A/A1_renamed.txt")
+    os.rename("/root/A/A2.txt", "/root/B/A2.txt")
+    fs.create_file("/root/B/B2.txt", contents="B2\n")
+
+    hashed_paths = []
+    multiple_format_hash_file_digests = ascmhl.commands.multiple_format_hash_file_digests
+
+    def counting_multiple_format_hash_file_digests(file_path, hash_formats, *args, **kwargs):
+        hashed_paths.append((file_path, tuple(hash_formats)))
+        return multiple_format_hash_file_digests(file_path, hash_formats, *args, **kwargs)
+
+    monkeypatch.setattr(
+        ascmhl.commands, "multiple_format_hash_file_digests", counting_multiple_format_hash_file_digests
+    )
+
+    # the new files are hashed in md5 while sealing, and once more in xxh64 to compare them with the missing files
+    result = runner.invoke(ascmhl.commands.create, ["/root", "-h", "md5", "-dr"])
+    assert not result.exception
+    assert sorted(hashed_path for hashed_path in hashed_paths if hashed_path[1] == ("xxh64",)) == [
+        ("/root/A/A1_renamed.txt", ("xxh64",)),
+        ("/root/B/A2.txt", ("xxh64",)),
+        ("/root/B/B2.txt", ("xxh64",)),
+    ]
+
+    history = MHLHistory.load_from_path("/root")
+    assert history.find_original_path_for_path("A/A1_renamed.txt") == "A/A1.txt"
+    assert history.find_original_path_for_path("B/A2.txt") == "A/A2.txt"
+    assert history.find_original_path_for_path("B/B2.txt") == "B/B2.txt"
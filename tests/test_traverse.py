@@ -0,0 +1,170 @@
+"""
+__author__ = "Patrick Renner"
+__copyright__ = "Copyright 2024, Pomfort GmbH"
+
+__license__ = "MIT"
+__maintainer__ = "Patrick Renner, Alexander Sahm"
+__email__ = "opensource@pomfort.com"
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import ascmhl.traverse
+from ascmhl.ignore import MHLIgnoreSpec
+from ascmhl.traverse import post_order_lexicographic, post_order_lexicographic_entries
+import ascmhl.workers
+from ascmhl.workers import map_folder_files, prefetch
+
+
+def test_post_order_lexicographic(fs):
+    fs.create_file("/root/b.txt", contents="b")
+    fs.create_file("/root/A/a2.txt", contents="a2")
+    fs.create_file("/root/A/a1.txt", contents="a1")
+    fs.create_file("/root/A/.DS_Store")
+    fs.create_dir("/root/C")
+
+    ignore_spec = MHLIgnoreSpec().get_path_spec()
+    assert list(post_order_lexicographic("/root", ignore_spec)) == [
+        ("/root/A", [("a1.txt", False), ("a2.txt", False)]),
+        ("/root/C", []),
+        ("/root", [("A", True), ("C", True), ("b.txt", False)]),
+    ]
+
+    # the entries carry the stat results and relative paths of the traversal
+    for folder, children in post_order_lexicographic_entries("/root/", ignore_spec):
+        assert folder.is_dir and folder.stat().st_mtime == os.stat(folder.path).st_mtime
+        assert folder.relative_path == os.path.relpath(folder.path, "/root")
+        for child in children:
+            assert child.path == os.path.join(folder.path, child.name)
+            assert child.relative_path == os.path.relpath(child.path, "/root")
+            assert child.stat().st_size == os.path.getsize(child.path)
+
+
+def test_post_order_lexicographic_deep_tree(fs):
+    # deeper than the recursion limit of python
+    depth = 300
+    deep_path = "/root/" + "/".join(["d"] * depth)
+    fs.create_file(deep_path + "/file.txt")
+
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(depth)
+    try:
+        folder_chunks = list(post_order_lexicographic("/root"))
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+    assert len(folder_chunks) == depth + 1
+    assert folder_chunks[0] == (deep_path, [("file.txt", False)])
+    assert folder_chunks[-1] == ("/root", [("d", True)])
+
+
+def test_post_order_lexicographic_parallel_listing(fs, monkeypatch):
+    for folder in ["A", "A/AA", "A/AB/ABA", "B", "C/CA", "C/CB", "D"]:
+        fs.create_file(f"/root/{folder}/file.txt")
+        fs.create_file(f"/root/{folder}/.DS_Store")
+
+    ignore_spec = MHLIgnoreSpec().get_path_spec()
+    expected_folder_chunks = list(post_order_lexicographic("/root", ignore_spec))
+    assert list(post_order_lexicographic("/root", ignore_spec, jobs=4)) == expected_folder_chunks
+
+    # folders that are not listed ahead are listed when the traversal reaches them
+    monkeypatch.setattr(ascmhl.traverse._FolderLister, "pending_folders_per_job", 1)
+    assert list(post_order_lexicographic("/root", ignore_spec, jobs=2)) == expected_folder_chunks
+
+
+def test_prefetch_traversal(fs):
+    for folder in ["A", "A/AA", "B", "C/CA"]:
+        fs.create_file(f"/root/{folder}/file.txt")
+
+    ignore_spec = MHLIgnoreSpec().get_path_spec()
+    expected_folder_chunks = list(post_order_lexicographic("/root", ignore_spec))
+    assert list(prefetch(post_order_lexicographic("/root", ignore_spec, jobs=2), 1)) == expected_folder_chunks
+
+    # exceptions are raised in order, stopping early stops the traversal
+    def failing_items():
+        yield 1
+        yield 2
+        raise OSError("listing failed")
+
+    items = prefetch(failing_items(), 1)
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(OSError):
+        next(items)
+
+    traversal = post_order_lexicographic("/root", ignore_spec)
+    items = prefetch(traversal, 1)
+    assert next(items) == expected_folder_chunks[0]
+    items.close()
+    assert next(traversal, None) is None
+
+
+def test_map_folder_files_bounds_pending_work(monkeypatch):
+    jobs = 2
+    max_pending_files = jobs * ascmhl.workers.pending_files_per_job
+    max_pending_chunks = jobs * ascmhl.workers.pending_folders_per_job
+    num_traversed_chunks = 0
+    max_unfinished_files = 0
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.unfinished_futures = set()
+
+        def submit(self, *args, **kwargs):
+            nonlocal max_unfinished_files
+            future = super().submit(*args, **kwargs)
+            self.unfinished_futures = {f for f in self.unfinished_futures if not f.done()} | {future}
+            max_unfinished_files = max(max_unfinished_files, len(self.unfinished_futures))
+            return future
+
+    monkeypatch.setattr(ascmhl.workers, "ThreadPoolExecutor", CountingExecutor)
+
+    def folder_chunks():
+        nonlocal num_traversed_chunks
+        # a folder with many files, followed by many folders without files
+        for index in range(max_pending_chunks * 4):
+            num_files = 1000 if index == 0 else 0
+            children = [SimpleNamespace(is_dir=False, name=str(i)) for i in range(num_files)]
+            num_traversed_chunks += 1
+            yield SimpleNamespace(index=index), children
+
+    def function(child):
+        return child.name
+
+    for index, (folder, children, results) in enumerate(map_folder_files(function, folder_chunks(), jobs)):
+        assert folder.index == index
+        assert results == [child.name for child in children]
+        # the folders without files are not queued without limit (in the prefetch queue and ahead of the caller)
+        assert num_traversed_chunks <= index + 1 + 2 * max_pending_chunks + 2
+    # the files of large folders are submitted one by one
+    assert 0 < max_unfinished_files <= max_pending_files
+
+
+def test_post_order_lexicographic_history_folders(fs):
+    for folder in ["ascmhl", "A/ascmhl", "A/AA", "B/BA/ascmhl", "B/BB"]:
+        fs.create_file(f"/root/{folder}/file.txt")
+
+    for jobs in [1, 4]:
+        events = []
+        traversal = post_order_lexicographic_entries(
+            "/root", MHLIgnoreSpec().get_path_spec(), jobs, lambda folder: events.append(("history", folder.path))
+        )
+        for folder, _ in traversal:
+            events.append(("folder", folder.path))
+        # the folders with an ascmhl folder are reported before any folder inside them is yielded
+        assert events == [
+            ("history", "/root"),
+            ("history", "/root/A"),
+            ("folder", "/root/A/AA"),
+            ("folder", "/root/A"),
+            ("history", "/root/B/BA"),
+            ("folder", "/root/B/BA"),
+            ("folder", "/root/B/BB"),
+            ("folder", "/root/B"),
+            ("folder", "/root"),
+        ]
@@ -106,3 +106,32 @@ def test_verify_single_file(fs, simple_mhl_history):
     # verify
     result = runner.invoke(ascmhl.commands.verify, ["-v", "-sf", "A/A1.txt", "/root/"])
     assert result.exit_code == 11
+
+
+@freeze_time("2020-01-16 09:15:00")
+def test_verify_parallel_jobs(fs, simple_mhl_history):
+    fs.create_file("/root/A/A2.txt", contents="A2\n")
+    fs.create_file("/root/B/B1.txt", contents="B1\n")
+    runner = CliRunner()
+    result = runner.invoke(ascmhl.commands.create, ["/root"])
+    assert result.exit_code == 0
+
+    result = runner.invoke(ascmhl.commands.verify, ["-v", "-j", "4", "/root/"])
+    assert result.exit_code == 0
+    assert result.output == runner.invoke(ascmhl.commands.verify, ["-v", "/root/"]).output
+
+    result = runner.invoke(ascmhl.commands.verify, ["-v", "-dh", "-j", "4", "/root/"])
+    assert result.exit_code == 0
+    assert result.output == runner.invoke(ascmhl.commands.verify, ["-v", "-dh", "/root/"]).output
+
+    # mismatches are reported in traversal order and lead to the same exit code
+    with open("/root/B/B1.txt", "a") as file:
+        file.write("!!")
+    with open("/root/A/A1.txt", "a") as file:
+        file.write("!!")
+    result = runner.invoke(ascmhl.commands.verify, ["-j", "4", "/root/"])
+    assert result.exit_code == 11
+    assert result.output.index("A/A1.txt") < result.output.index("B/B1.txt")
+
+    result = runner.invoke(ascmhl.commands.verify, ["-dh", "-j", "4", "/root/"])
+    assert result.exit_code == 12